@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+#
+# Autocorrelation engine and overlap-add parity check
+#
+# usage: python corrcheck.py [-v] [-n ntrials] [-s seed] [-e tolerance]
+#
+# Compares the similarities computed by the direct and FFT engines
+# of wavcorr.autocorrs16 and wavcorr.matchs16 on synthetic signals,
+# the similarities of wavcorr.matchprofs16 with the direct matchs16
+# (and that its minsim never skips a pattern that reaches minsim),
+# and the output of wavcorr.psolas16into (PSOLA_ADD/PSOLA_ADDF)
+# with a numpy reference.
+#
+
+import sys
+import array
+import random
+from math import sin, pi
+import wavcorr
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# gen_signal: generates length frames of a random synthetic signal.
+def gen_signal(length):
+    kind = random.choice(('sine', 'harmonic', 'noise', 'silence', 'clip'))
+    freq = random.uniform(0.001, 0.2)
+    noise = random.choice((0, 100, 5000))
+    a = array.array('h')
+    for i in xrange(length):
+        if kind == 'sine':
+            x = 20000*sin(i*freq)
+        elif kind == 'harmonic':
+            x = 10000*sin(i*freq)+6000*sin(2*i*freq)+3000*sin(3*i*freq)
+        elif kind == 'clip':
+            x = 40000*sin(i*freq)
+        else:
+            x = 0
+        if kind != 'silence':
+            x += random.gauss(0, noise)
+        a.append(int(max(-32768, min(32767, x))))
+    return (kind, a.tostring())
+
+# check: returns the largest difference between the engines.
+def check(window0, window1, data, offset):
+    (direct, fft) = [
+        dict(wavcorr.autocorrs16(window0, window1, -sys.maxint, window1-window0+1,
+                                 data, offset, engine))
+        for engine in (wavcorr.AUTOCORR_DIRECT, wavcorr.AUTOCORR_FFT) ]
+    assert sorted(direct.keys()) == sorted(fft.keys())
+    return max( abs(direct[w]-fft[w]) for w in direct )
+
+# autocorr_trial: runs check() with random parameters.
+def autocorr_trial():
+    window0 = random.randint(1, 300)
+    window1 = window0+random.randint(0, 1500)
+    offset = random.randint(0, 100)
+    # Some lags do not fit when the data is shorter than window1*2.
+    length = offset+random.randint(window1, window1*3)
+    (kind, data) = gen_signal(length)
+    d = check(window0, window1, data, offset)
+    return ('%s window0=%d window1=%d length=%d offset=%d' %
+            (kind, window0, window1, length, offset), d)
+
+# match_trial: compares the matchs16 engines with random parameters.
+def match_trial():
+    patlen = random.randint(1, 800)
+    window = random.randint(1, 1500)
+    offset = random.randint(0, 100)
+    (kind, pat) = gen_signal(patlen)
+    (_, data) = gen_signal(offset+window)
+    (direct, fft) = [
+        wavcorr.matchs16(pat, offset, window, data, engine)
+        for engine in (wavcorr.AUTOCORR_DIRECT, wavcorr.AUTOCORR_FFT) ]
+    return ('%s patlen=%d window=%d offset=%d' %
+            (kind, patlen, window, offset), abs(direct-fft))
+
+# prof_trial: compares matchprofs16 with the direct matchs16.
+def prof_trial():
+    patlen = random.randint(1, 800)
+    window = random.randint(1, 1500)
+    offset = random.randint(0, 100)
+    (kind, pat) = gen_signal(patlen)
+    (_, data) = gen_signal(offset+window)
+    prof = wavcorr.makematchprof16(pat, window)
+    (_, s) = wavcorr.matchprofs16(prof, data, offset)
+    direct = wavcorr.matchs16(pat, offset, window, data, wavcorr.AUTOCORR_DIRECT)
+    return ('%s patlen=%d window=%d offset=%d' %
+            (kind, patlen, window, offset), abs(direct-s))
+
+# prune_trial: checks that matchprofs16 never skips a pattern whose
+#   similarity is at least minsim, and that the returned bound holds.
+def prune_trial():
+    patlen = random.randint(1, 800)
+    window = random.randint(1, 1500)
+    offset = random.randint(0, 100)
+    (kind, pat) = gen_signal(patlen)
+    if random.random() < 0.5:
+        # The bound is tight when the data is the stretched pattern.
+        a = array.array('h', pat)
+        shift = random.randint(0, patlen-1)
+        data = array.array('h', [0]*offset)
+        data.extend( a[(i*patlen//window+shift) % patlen] for i in xrange(window) )
+        data = data.tostring()
+    else:
+        (_, data) = gen_signal(offset+window)
+    prof = wavcorr.makematchprof16(pat, window)
+    direct = wavcorr.matchs16(pat, offset, window, data, wavcorr.AUTOCORR_DIRECT)
+    minsim = random.choice((direct, direct-random.uniform(0, 0.05),
+                            direct+random.uniform(-0.5, 0.5)))
+    (d, s) = wavcorr.matchprofs16(prof, data, offset, minsim)
+    if d < 0:
+        # Skipped: s is an upper bound below minsim.
+        diff = (1.0 if minsim <= direct else max(0, direct-s))
+    else:
+        diff = abs(direct-s)
+    return ('%s patlen=%d window=%d offset=%d minsim=%.4f skipped=%d' %
+            (kind, patlen, window, offset, minsim, d < 0), diff)
+
+# hann_ref: numpy version of hann() in wavcorr.c.
+def hann_ref(i, n):
+    return (1.0-numpy.cos(2.0*pi*i/n))/2.0
+
+# psola_ref: numpy version of psolaadds16() without the final store.
+def psola_ref(outlen, seq1, seq2):
+    i = numpy.arange(outlen)
+    v = numpy.zeros(outlen)
+    if len(seq1):
+        v += seq1[i*len(seq1)//outlen] * hann_ref(i+outlen, outlen*2)
+    if len(seq2):
+        v += seq2[i*len(seq2)//outlen] * hann_ref(i, outlen*2)
+    return v
+
+# check_psola: overlap-adds grains in both modes and returns
+#   the largest difference from the reference in int16 steps.
+def check_psola(grains, data, init):
+    ref = numpy.array(init, dtype=numpy.float64)
+    reff = (ref/32768.0).astype(numpy.float32)
+    out = bytearray(array.array('h', init).tostring())
+    outf = bytearray(reff.tostring())
+    seq = numpy.frombuffer(data, dtype=numpy.int16).astype(numpy.float64)
+    for (outoffset, outlen, offset1, window1, offset2, window2) in grains:
+        wavcorr.psolas16into(out, outoffset, outlen,
+                             offset1, window1, data,
+                             offset2, window2, data, wavcorr.PSOLA_ADD)
+        wavcorr.psolas16into(outf, outoffset, outlen,
+                             offset1, window1, data,
+                             offset2, window2, data, wavcorr.PSOLA_ADDF)
+        v = psola_ref(outlen, seq[offset1:offset1+window1],
+                      seq[offset2:offset2+window2])
+        # PSOLA_ADD saturates at every grain.
+        x = ref[outoffset:outoffset+outlen] + v
+        ref[outoffset:outoffset+outlen] = numpy.trunc(numpy.clip(x, -32768, 32767))
+        # PSOLA_ADDF accumulates in float32.
+        reff[outoffset:outoffset+outlen] += (v/32768.0).astype(numpy.float32)
+    a = numpy.frombuffer(str(out), dtype=numpy.int16)
+    b = numpy.frombuffer(wavcorr.float32topcm(outf, 2), dtype=numpy.int16)
+    reff = numpy.trunc(numpy.clip(reff.astype(numpy.float64)*32767.0, -32768, 32767))
+    return max(numpy.abs(a-ref).max(), numpy.abs(b-reff).max())
+
+# psola_trial: runs check_psola() with random grains, starting from
+#   silence or from a buffer close to saturation.
+def psola_trial():
+    length = random.randint(1, 2000)
+    (kind, data) = gen_signal(length)
+    start = random.choice(('zero', 'high', 'low', 'extreme'))
+    n = random.randint(500, 3000)
+    if start == 'high':
+        init = [ random.randint(30000, 32767) for _ in xrange(n) ]
+    elif start == 'low':
+        init = [ random.randint(-32768, -30000) for _ in xrange(n) ]
+    elif start == 'extreme':
+        init = [ random.choice((-32768, 32767)) for _ in xrange(n) ]
+    else:
+        init = [0]*n
+    grains = []
+    for _ in xrange(random.randint(1, 10)):
+        outlen = random.randint(1, n)
+        outoffset = random.randint(0, n-outlen)
+        window1 = random.randint(0, length)
+        offset1 = random.randint(0, length-window1)
+        window2 = random.randint(0, length)
+        offset2 = random.randint(0, length-window2)
+        grains.append((outoffset, outlen, offset1, window1, offset2, window2))
+    d = check_psola(grains, data, init)
+    return ('%s start=%s length=%d grains=%d' %
+            (kind, start, n, len(grains)), d)
+
+# main
+def main(argv):
+    import getopt
+    def usage():
+        print 'usage: %s [-v] [-n ntrials] [-s seed] [-e tolerance]' % argv[0]
+        return 100
+    try:
+        (opts, args) = getopt.getopt(argv[1:], 'vn:s:e:')
+    except getopt.GetoptError:
+        return usage()
+    verbose = 0
+    ntrials = 200
+    seed = 0
+    tolerance = 1e-9
+    for (k, v) in opts:
+        if k == '-v': verbose += 1
+        elif k == '-n': ntrials = int(v)
+        elif k == '-s': seed = int(v)
+        elif k == '-e': tolerance = float(v)
+    random.seed(seed)
+    checks = [('autocorrs16', autocorr_trial, tolerance),
+              ('matchs16', match_trial, tolerance),
+              ('matchprofs16', prof_trial, tolerance),
+              ('matchprofs16 minsim', prune_trial, tolerance)]
+    if numpy is not None:
+        # A sample may be off by one step where truncation meets rounding.
+        checks.append(('psolas16into', psola_trial, 1))
+    else:
+        print 'psolas16into: skipped (numpy not found)'
+    status = 0
+    for (name, trial, limit) in checks:
+        nfailed = 0
+        worst = 0
+        for i in xrange(ntrials):
+            (desc, d) = trial()
+            worst = max(worst, d)
+            if limit < d:
+                print 'FAILED: %s: %s diff=%g' % (name, desc, d)
+                nfailed += 1
+            elif verbose:
+                print 'ok: %s: %s diff=%g' % (name, desc, d)
+        print '%s: %d/%d passed, max diff=%g' % (name, ntrials-nfailed, ntrials, worst)
+        if nfailed:
+            status = 1
+    return status
+
+if __name__ == '__main__': sys.exit(main(sys.argv))
@@ -4,16 +4,33 @@
 #
 # usage:
 #   $ python genwav.py {-S|-Q|-T|-N} [-o out.wav] [tone ...]
+#   $ python genwav.py [-m maxlength] [-C cachedir] -b manifest [-j nprocs]
+#
+# manifest (columns delimited by a tab)
+#   out1.wav    sine('A4')
+#   out2.wav    mult(saw('C5'), env(0.5, 1.0, 0.0))
+#   ...
 #
 
 import sys
+import time
 import wave
 import struct
 import array
 import random
 import os.path
+import errno
+import ast
+import json
+import hashlib
+import operator
+from collections import OrderedDict
 from math import sin, cos, pi
 from wavestream import WaveWriter
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 ##  WaveGenerator
@@ -85,7 +102,7 @@ class WaveGenerator(object):
 
     def mix(self, *iters):
         r = 1.0/len(iters)
-        return self.amp(r, self.add(*iters))
+        return self.amp(self.add(*iters), r)
 
     def amp(self, it, volume):
         for x in it:
@@ -156,8 +173,584 @@ class WaveGenerator(object):
                 for i in xrange(w):
                     yield x
         return
+
+##  Block nodes
+##
+##  Each node produces a stream of samples in blocks.
+##  read(n) returns a numpy array of at most n samples;
+##  a block shorter than n means the end of the stream.
+##
+class BlockNode(object):
+
+    def read(self, n):
+        raise NotImplementedError
+
+class SineNode(BlockNode):
+
+    def __init__(self, framerate, freq):
+        self.inc = 2*pi*freq/framerate
+        self.phase = 0.0
+        return
+
+    def read(self, n):
+        phase = self.phase + self.inc*numpy.arange(n)
+        self.phase = (self.phase + self.inc*n) % (2*pi)
+        return numpy.sin(phase)
+
+class RectNode(BlockNode):
+
+    def __init__(self, framerate, freq):
+        self.inc = float(freq)/framerate
+        self.phase = 0.0
+        return
+
+    def read(self, n):
+        if self.inc == 0:
+            return numpy.zeros(n)
+        phase = (self.phase + self.inc*numpy.arange(n)) % 1.0
+        self.phase = (self.phase + self.inc*n) % 1.0
+        return numpy.where(phase < 0.5, 1.0, -1.0)
+
+class SawNode(BlockNode):
+
+    def __init__(self, framerate, freq):
+        self.inc = float(freq)/framerate
+        self.phase = 0.0
+        return
+
+    def read(self, n):
+        if self.inc == 0:
+            return numpy.zeros(n)
+        phase = (self.phase + self.inc*numpy.arange(n)) % 1.0
+        self.phase = (self.phase + self.inc*n) % 1.0
+        return phase*2.0-1.0
+
+class NoiseNode(BlockNode):
+
+    def __init__(self, framerate, freq):
+        self.width = (int(framerate/freq/2) if freq else 0)
+        self.value = 0.0
+        self.left = 0
+        return
+
+    def read(self, n):
+        if self.width == 0:
+            return numpy.zeros(n)
+        # hold each random value for width samples.
+        m = (n-self.left+self.width-1) // self.width
+        values = numpy.random.uniform(-1.0, 1.0, max(0, m))
+        block = numpy.concatenate((numpy.repeat(self.value, min(self.left, n)),
+                                   numpy.repeat(values, self.width)))[:n]
+        if 0 < m:
+            self.value = values[-1]
+            self.left = m*self.width - (n-self.left)
+        else:
+            self.left -= n
+        return block
+
+class EnvNode(BlockNode):
+
+    def __init__(self, framerate, duration, a0, a1):
+        self.length = int(framerate * duration)
+        self.a0 = a0
+        self.r = (a1-a0)/float(self.length) if self.length else 0.0
+        self.i = 0
+        return
+
+    def read(self, n):
+        n = max(0, min(n, self.length-self.i))
+        block = self.a0+(numpy.arange(self.i, self.i+n)+1)*self.r
+        self.i += n
+        return block
+
+class ClipNode(BlockNode):
+
+    def __init__(self, framerate, node, duration):
+        self.node = node
+        self.left = int(framerate * duration)
+        return
+
+    def read(self, n):
+        n = max(0, min(n, self.left))
+        block = self.node.read(n)
+        self.left -= len(block)
+        if len(block) < n:
+            self.left = 0
+        return block
+
+class AmpNode(BlockNode):
+
+    def __init__(self, node, volume):
+        self.node = node
+        self.volume = volume
+        return
+
+    def read(self, n):
+        return self.node.read(n)*self.volume
+
+class AddNode(BlockNode):
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        return
+
+    def read(self, n):
+        blocks = [ node.read(n) for node in self.nodes ]
+        n = min( len(b) for b in blocks )
+        x = numpy.zeros(n)
+        for b in blocks:
+            x += b[:n]
+        return x
+
+class MultNode(BlockNode):
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        return
+
+    def read(self, n):
+        blocks = [ node.read(n) for node in self.nodes ]
+        n = min( len(b) for b in blocks )
+        x = numpy.ones(n)
+        for b in blocks:
+            x *= b[:n]
+        return x
+
+class ConcatNode(BlockNode):
+
+    def __init__(self, nodes):
+        self.nodes = list(nodes)
+        return
+
+    def read(self, n):
+        blocks = []
+        while self.nodes and 0 < n:
+            b = self.nodes[0].read(n)
+            blocks.append(b)
+            n -= len(b)
+            if 0 < n:
+                self.nodes.pop(0)
+        if not blocks:
+            return numpy.zeros(0)
+        return numpy.concatenate(blocks)
+
+
+class TeeNode(BlockNode):
+
+    """Shares one node between several readers (taps)."""
+
+    def __init__(self, node):
+        self.node = node
+        self.buf = numpy.zeros(0)
+        self.start = 0
+        self.taps = []
+        self.ended = False
+        return
+
+    def tap(self):
+        tap = TapNode(self)
+        self.taps.append(tap)
+        return tap
+
+    def read_at(self, tap, n):
+        need = tap.pos+n - (self.start+len(self.buf))
+        if 0 < need and not self.ended:
+            b = self.node.read(need)
+            if len(b) < need:
+                self.ended = True
+            self.buf = numpy.concatenate((self.buf, b))
+        i = tap.pos-self.start
+        block = self.buf[i:i+n]
+        tap.pos += len(block)
+        # discard the samples that all the taps have read.
+        low = min( t.pos for t in self.taps )
+        if self.start < low:
+            self.buf = self.buf[low-self.start:]
+            self.start = low
+        return block
+
+class TapNode(BlockNode):
+
+    def __init__(self, tee):
+        self.tee = tee
+        self.pos = 0
+        return
+
+    def read(self, n):
+        return self.tee.read_at(self, n)
+
+class BufferNode(BlockNode):
+
+    """Replays samples that were rendered before."""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.i = 0
+        return
+
+    def read(self, n):
+        block = self.samples[self.i:self.i+n]
+        self.i += len(block)
+        return block
+
+class RecordNode(BlockNode):
+
+    """Stores the whole output of a node in a RenderCache."""
+
+    def __init__(self, node, cache, key):
+        self.node = node
+        self.cache = cache
+        self.key = key
+        self.blocks = []
+        return
+
+    def read(self, n):
+        block = self.node.read(n)
+        if self.blocks is not None:
+            self.blocks.append(block)
+            if len(block) < n:
+                self.cache.put(self.key, numpy.concatenate(self.blocks))
+                self.blocks = None
+        return block
+
+
+##  BlockWaveGenerator
+##
+##  Same expressions as WaveGenerator, but evaluated block by block.
+##
+class BlockWaveGenerator(WaveGenerator):
+
+    def add(self, *nodes):
+        return AddNode(nodes)
+
+    def mult(self, *nodes):
+        return MultNode(nodes)
+
+    def concat(self, *nodes):
+        return ConcatNode(nodes)
+
+    def mix(self, *nodes):
+        return AmpNode(AddNode(nodes), 1.0/len(nodes))
+
+    def amp(self, node, volume):
+        return AmpNode(node, volume)
+
+    def clip(self, node, duration):
+        return ClipNode(self.framerate, node, duration)
+
+    def env(self, duration, a0, a1):
+        return EnvNode(self.framerate, duration, a0, a1)
+
+    def sine(self, freq):
+        return SineNode(self.framerate, self.tone2freq(freq))
+
+    def rect(self, freq):
+        return RectNode(self.framerate, self.tone2freq(freq))
+
+    def saw(self, freq):
+        return SawNode(self.framerate, self.tone2freq(freq))
+
+    def noise(self, freq):
+        return NoiseNode(self.framerate, self.tone2freq(freq))
+
+    def blocks(self, node, blocksize=4096):
+        while 1:
+            block = node.read(blocksize)
+            if len(block):
+                yield block
+            if len(block) < blocksize: break
+        return
         
 
+##  RenderCache
+##
+##  Rendered samples of finite subexpressions, keyed by their
+##  canonical form. Kept in memory (LRU) and optionally on disk.
+##  The files on disk are shared by the worker processes. The least
+##  recently used files are removed when the total size exceeds
+##  maxbytes. The total is checked every maxbytes/16 bytes written.
+##
+class RenderCache(object):
+
+    def __init__(self, path=None, maxsamples=10000000, maxbytes=100*1024*1024):
+        self.path = path
+        self.maxsamples = maxsamples
+        self.maxbytes = maxbytes
+        self.nsamples = 0
+        self._cache = OrderedDict()
+        self._added = 0
+        return
+
+    def _getpath(self, key):
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest()+'.npy')
+
+    def get(self, key):
+        if key in self._cache:
+            samples = self._cache.pop(key)
+            self._cache[key] = samples
+            return samples
+        if self.path is not None:
+            path = self._getpath(key)
+            if os.path.exists(path):
+                try:
+                    samples = numpy.load(path)
+                    os.utime(path, None)
+                except (IOError, OSError, ValueError):
+                    # removed or broken.
+                    return None
+                self._add(key, samples)
+                return samples
+        return None
+
+    def put(self, key, samples):
+        self._add(key, samples)
+        if self.path is not None:
+            path = self._getpath(key)
+            tmppath = '%s.%d.tmp' % (path, os.getpid())
+            fp = open(tmppath, 'wb')
+            numpy.save(fp, samples)
+            fp.close()
+            os.rename(tmppath, path)
+            self._added += samples.nbytes
+            if self.maxbytes/16 < self._added:
+                self.prune()
+        return
+
+    def prune(self):
+        # Remove the oldest files down to 90% of maxbytes.
+        self._added = 0
+        files = []
+        for name in os.listdir(self.path):
+            if not (name.endswith('.npy') or name.endswith('.graph')): continue
+            path = os.path.join(self.path, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        nbytes = sum( size for (_,size,_) in files )
+        if nbytes <= self.maxbytes: return
+        for (_,size,path) in sorted(files):
+            if nbytes <= self.maxbytes*0.9: break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            nbytes -= size
+        return
+
+    def _add(self, key, samples):
+        if key in self._cache:
+            self.nsamples -= len(self._cache.pop(key))
+        self._cache[key] = samples
+        self.nsamples += len(samples)
+        while self.maxsamples < self.nsamples and self._cache:
+            (_,old) = self._cache.popitem(last=False)
+            self.nsamples -= len(old)
+        return
+
+
+##  RenderGraph
+##
+##  A compiled expression. ops is a list of (kind, inputs, params)
+##  in topological order, where inputs are indices of other ops.
+##  Identical subexpressions are shared (except noise).
+##
+class RenderGraph(object):
+
+    # kind: (number of node arguments (-1 for any), number of parameters)
+    FUNCS = {
+        'add': (-1, 0),
+        'mult': (-1, 0),
+        'concat': (-1, 0),
+        'mix': (-1, 0),
+        'amp': (1, 1),
+        'clip': (1, 1),
+        'env': (0, 3),
+        'sine': (0, 1),
+        'rect': (0, 1),
+        'saw': (0, 1),
+        'noise': (0, 1),
+    }
+    OPERATORS = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: operator.mul,
+        ast.Div: operator.truediv,
+        ast.Pow: operator.pow,
+    }
+
+    def __init__(self, framerate, ops, root):
+        self.framerate = framerate
+        self.ops = ops
+        self.root = root
+        self.refs = [0]*len(ops)
+        self.refs[root] += 1
+        self.keys = []
+        self.finite = []
+        self.random = []
+        for (kind,inputs,params) in ops:
+            for i in inputs:
+                self.refs[i] += 1
+            args = [ repr(x) for x in params ] + [ self.keys[i] for i in inputs ]
+            self.keys.append('%s(%s)' % (kind, ','.join(args)))
+            if kind in ('env', 'clip'):
+                finite = True
+            elif kind in ('add', 'mult'):
+                finite = any( self.finite[i] for i in inputs )
+            elif kind in ('amp', 'concat'):
+                finite = all( self.finite[i] for i in inputs )
+            else:
+                finite = False
+            self.finite.append(finite)
+            self.random.append(kind == 'noise' or
+                               any( self.random[i] for i in inputs ))
+        return
+
+    def __repr__(self):
+        return '<RenderGraph: %s>' % self.keys[self.root]
+
+    @classmethod
+    def compile(klass, expr, framerate):
+        ops = []
+        index = {}
+        def const(v):
+            if isinstance(v, ast.Num):
+                return v.n
+            elif isinstance(v, ast.Str):
+                return WaveGenerator.tone2freq(v.s)
+            elif isinstance(v, ast.Name) and v.id == 'pi':
+                return pi
+            elif isinstance(v, ast.UnaryOp) and isinstance(v.op, (ast.UAdd, ast.USub)):
+                x = const(v.operand)
+                return (-x if isinstance(v.op, ast.USub) else x)
+            elif isinstance(v, ast.BinOp) and type(v.op) in klass.OPERATORS:
+                return klass.OPERATORS[type(v.op)](const(v.left), const(v.right))
+            raise ValueError('not a constant: %s' % ast.dump(v))
+        def add(kind, inputs, params):
+            inputs = tuple(inputs)
+            params = tuple( float(x) for x in params )
+            if kind == 'mix':
+                return add('amp', [add('add', inputs, ())], [1.0/len(inputs)])
+            if kind in ('add', 'mult', 'concat') and len(inputs) == 1:
+                return inputs[0]
+            if kind == 'amp':
+                if params[0] == 1.0:
+                    return inputs[0]
+                (kind1,inputs1,params1) = ops[inputs[0]]
+                if kind1 == 'amp':
+                    return add('amp', inputs1, [params1[0]*params[0]])
+            key = (kind, inputs, params)
+            if kind == 'noise':
+                key += (len(ops),)
+            if key not in index:
+                index[key] = len(ops)
+                ops.append((kind, inputs, params))
+            return index[key]
+        def walk(v):
+            if (isinstance(v, ast.Call) and isinstance(v.func, ast.Name) and
+                v.func.id not in klass.FUNCS):
+                raise ValueError('unknown function: %s' % v.func.id)
+            if not (isinstance(v, ast.Call) and isinstance(v.func, ast.Name) and
+                    v.func.id in klass.FUNCS and
+                    not v.keywords and v.starargs is None and v.kwargs is None):
+                raise ValueError('invalid expression: %s' % ast.dump(v))
+            kind = v.func.id
+            (ninputs, nparams) = klass.FUNCS[kind]
+            if ninputs < 0:
+                if not v.args: raise ValueError('no arguments: %s' % kind)
+                inputs = [ walk(x) for x in v.args ]
+                params = []
+            else:
+                if len(v.args) != ninputs+nparams:
+                    raise ValueError('wrong number of arguments: %s' % kind)
+                inputs = [ walk(x) for x in v.args[:ninputs] ]
+                params = [ const(x) for x in v.args[ninputs:] ]
+            return add(kind, inputs, params)
+        root = walk(ast.parse(expr.strip(), mode='eval').body)
+        # remove the ops that are not used anymore.
+        used = set([root])
+        for i in reversed(xrange(len(ops))):
+            if i in used:
+                used.update(ops[i][1])
+        renum = {}
+        for i in sorted(used):
+            renum[i] = len(renum)
+        ops = [ (kind, tuple( renum[j] for j in inputs ), params)
+                for (i,(kind,inputs,params)) in enumerate(ops) if i in used ]
+        return klass(framerate, ops, renum[root])
+
+    @classmethod
+    def load(klass, fp):
+        obj = json.load(fp)
+        ops = [ (kind, tuple(inputs), tuple(params))
+                for (kind,inputs,params) in obj['ops'] ]
+        return klass(obj['framerate'], ops, obj['root'])
+
+    def dump(self, fp):
+        json.dump({'framerate': self.framerate, 'ops': self.ops,
+                   'root': self.root}, fp)
+        return
+
+    def build(self, gen, cache=None):
+        """Instantiates the graph with a WaveGenerator."""
+        if not isinstance(gen, BlockWaveGenerator):
+            # per-sample generators cannot be shared: expand the tree.
+            def expand(i):
+                (kind,inputs,params) = self.ops[i]
+                return getattr(gen, kind)(*([ expand(j) for j in inputs ]+list(params)))
+            return expand(self.root)
+        tees = {}
+        def get(i):
+            if i in tees:
+                return tees[i].tap()
+            (kind,inputs,params) = self.ops[i]
+            key = '%d:%s' % (self.framerate, self.keys[i])
+            samples = None
+            if (cache is not None and inputs and
+                self.finite[i] and not self.random[i]):
+                samples = cache.get(key)
+            if samples is not None:
+                node = BufferNode(samples)
+            else:
+                node = getattr(gen, kind)(*([ get(j) for j in inputs ]+list(params)))
+                if (cache is not None and inputs and
+                    self.finite[i] and not self.random[i]):
+                    node = RecordNode(node, cache, key)
+            if 1 < self.refs[i]:
+                tees[i] = TeeNode(node)
+                return tees[i].tap()
+            return node
+        return get(self.root)
+
+# load_graph: compiles an expression, or loads it from the cache directory.
+def load_graph(expr, framerate, cachedir=None):
+    if cachedir is None:
+        return RenderGraph.compile(expr, framerate)
+    key = hashlib.sha1('%d:%s' % (framerate, expr)).hexdigest()
+    path = os.path.join(cachedir, key+'.graph')
+    try:
+        fp = open(path, 'rb')
+        try:
+            return RenderGraph.load(fp)
+        finally:
+            fp.close()
+    except (IOError, ValueError, KeyError):
+        pass
+    graph = RenderGraph.compile(expr, framerate)
+    try:
+        os.makedirs(cachedir)
+    except OSError, e:
+        if e.errno != errno.EEXIST: raise
+    # Other processes may be reading the same file.
+    tmppath = '%s.%d.tmp' % (path, os.getpid())
+    fp = open(tmppath, 'wb')
+    graph.dump(fp)
+    fp.close()
+    os.rename(tmppath, path)
+    return graph
+
+
 # gen_sine_tone
 def gen_sine_tone(framerate, tones, volume=0.4, duration=0.02):
     print 'gen_sine_tone', tones
@@ -192,46 +785,141 @@ def gen_noise_tone(framerate, tones, volume=0.5, attack=0.01, decay=0.7):
                      gen.env(decay, volume, 0.0))
     return gen.mult(wav, env)
 
+# render: renders an expression to a wave file.
+# A partial file is removed if rendering fails.
+def render(path, expr, maxlength=10, framerate=44100, cachedir=None, cache=None):
+    graph = load_graph(expr, framerate, cachedir)
+    fp = open(path, 'wb')
+    try:
+        stream = WaveWriter(fp, framerate=framerate)
+        if numpy is not None:
+            gen = BlockWaveGenerator(stream.framerate)
+            if cache is None:
+                cache = RenderCache(cachedir)
+            wav = graph.build(gen, cache)
+            for block in gen.blocks(gen.clip(wav, maxlength)):
+                stream.writeblock(block)
+        else:
+            gen = WaveGenerator(stream.framerate)
+            wav = graph.build(gen)
+            stream.write(gen.clip(wav, maxlength))
+        stream.close()
+    except:
+        fp.close()
+        os.unlink(path)
+        raise
+    fp.close()
+    return stream.tell()
+
+# render_job: renders one manifest entry in a worker process.
+worker_cache = None
+def init_worker(cachedir, cachesize=100):
+    global worker_cache
+    if numpy is not None:
+        worker_cache = RenderCache(cachedir, maxbytes=cachesize*1024*1024)
+    return
+def render_job(job):
+    (path, expr, maxlength, framerate, cachedir) = job
+    t0 = time.time()
+    try:
+        nframes = render(path, expr, maxlength, framerate, cachedir, worker_cache)
+    except (ValueError, SyntaxError, EnvironmentError), e:
+        return (path, None, str(e), time.time()-t0)
+    return (path, nframes, None, time.time()-t0)
+
+# render_batch: renders a manifest of "path<TAB>expr" lines.
+def render_batch(manifest, maxlength=10, framerate=44100, cachedir=None,
+                 cachesize=100, nprocs=1, force=False, statepath=None):
+    jobs = []
+    fp = open(manifest)
+    for line in fp:
+        (line,_,_) = line.partition('#')
+        line = line.strip()
+        if not line: continue
+        (path,_,expr) = line.partition('\t')
+        jobs.append((path.strip(), expr.strip()))
+    fp.close()
+    # skip the outputs whose expression and parameters are not changed.
+    if statepath is None:
+        statepath = manifest+'.state'
+    state = {}
+    if os.path.exists(statepath):
+        fp = open(statepath)
+        state = json.load(fp)
+        fp.close()
+    def digest(expr):
+        return hashlib.sha1('%d:%r:%s' % (framerate, maxlength, expr)).hexdigest()
+    exprs = dict(jobs)
+    todo = []
+    for (path,expr) in jobs:
+        if (not force and os.path.exists(path) and
+            state.get(path) == digest(expr)):
+            print '%s: skipped' % path
+        else:
+            todo.append((path, expr, maxlength, framerate, cachedir))
+    t0 = time.time()
+    if 1 < nprocs and 1 < len(todo):
+        import multiprocessing
+        pool = multiprocessing.Pool(nprocs, init_worker, (cachedir, cachesize))
+        results = pool.imap_unordered(render_job, todo)
+    else:
+        init_worker(cachedir, cachesize)
+        pool = None
+        results = ( render_job(job) for job in todo )
+    nerrors = 0
+    for (path,nframes,error,elapsed) in results:
+        if error is None:
+            print '%s: frames=%d, time=%.3fs' % (path, nframes, elapsed)
+            state[path] = digest(exprs[path])
+        else:
+            print '%s: error: %s' % (path, error)
+            state.pop(path, None)
+            nerrors += 1
+    if pool is not None:
+        pool.close()
+        pool.join()
+    print ('rendered=%d, skipped=%d, errors=%d, time=%.3fs' %
+           (len(todo)-nerrors, len(jobs)-len(todo), nerrors, time.time()-t0))
+    fp = open(statepath, 'w')
+    json.dump(state, fp, indent=1, sort_keys=True)
+    fp.close()
+    return nerrors
+
 # main
 def main(argv):
     import getopt
     def usage():
-        print 'usage: %s [-f] [-o out.wav] [-m maxlength] [expr]' % argv[0]
+        print ('usage: %s [-f] [-o out.wav] [-m maxlength] [-C cachedir [-Z maxmb]]'
+               ' {expr | -b manifest [-j nprocs]}' % argv[0])
         return 100
     try:
-        (opts, args) = getopt.getopt(argv[1:], 'fo:m:')
+        (opts, args) = getopt.getopt(argv[1:], 'fo:m:C:Z:b:j:')
     except getopt.GetoptError:
         return usage()
     force = False
     maxlength = 10
     path = 'out.wav'
+    cachedir = None
+    cachesize = 100
+    manifest = None
+    nprocs = 1
     for (k, v) in opts:
         if k == '-f': force = True
         elif k == '-o': path = v
         elif k == '-m': maxlength = float(v)
+        elif k == '-C': cachedir = v
+        elif k == '-Z': cachesize = int(v)
+        elif k == '-b': manifest = v
+        elif k == '-j': nprocs = int(v)
+    if manifest is not None:
+        nerrors = render_batch(manifest, maxlength=maxlength, cachedir=cachedir,
+                               cachesize=cachesize, nprocs=nprocs, force=force)
+        return (1 if nerrors else 0)
     if not args: return usage()
     if not force and os.path.exists(path): raise IOError(path)
-    fp = open(path, 'wb')
-    stream = WaveWriter(fp)
     expr = args.pop(0)
-    gen = WaveGenerator(stream.framerate)
-    vars = {
-        'add': gen.add,
-        'mult': gen.mult,
-        'amp': gen.amp,
-        'concat': gen.concat,
-        'mix': gen.mix,
-        'clip': gen.clip,
-        'env': gen.env,
-        'sine': gen.sine,
-        'rect': gen.rect,
-        'saw': gen.saw,
-        'noise': gen.noise,
-    }
-    wav = eval(expr, vars, {})
-    stream.write(gen.clip(wav, maxlength))
-    stream.close()
-    fp.close()
+    init_worker(cachedir, cachesize)
+    render(path, expr, maxlength, cachedir=cachedir, cache=worker_cache)
     return 0
 
 if __name__ == '__main__': sys.exit(main(sys.argv))
@@ -1,79 +1,356 @@
 #!/usr/bin/env python
 #
-# usage: python match.py wav pitch ...
+# usage: python match.py [-v] [-t threshold] [-k topk] [-E engine] [-B bank] [-M maxmb] [-j nprocs] wav pitch ...
 #
 
 import sys
+import os
+import cPickle as pickle
+import multiprocessing
+from collections import OrderedDict
 import wavcorr
 from wavestream import WaveReader
+from pitchtrack import ispitchtrack, PitchTrackReader
+
+
+# load_pitch: yields (frame, window) of each pitch mark,
+# or None at the end of each streak.
+def load_pitch(path, framerate):
+    if ispitchtrack(path):
+        track = PitchTrackReader(path)
+        streak = None
+        for (f,_,lag,_,s) in track.best():
+            if streak is not None and streak != s:
+                yield None
+            streak = s
+            yield (f, lag)
+        if streak is not None:
+            yield None
+        track.close()
+        return
+    fp = open(path)
+    for line in fp:
+        line = line.strip()
+        if not line:
+            yield None
+        (line,_,_) = line.partition('#')
+        if not line: continue
+        (f, _, pitch) = line.partition(' ')
+        yield (int(f), int(framerate/int(pitch)))
+    fp.close()
+    return
+
+
+##  PatternBank
+##
+##  Keeps the patterns and their profiles (precomputed spectra,
+##  sums and energies) for each window length in a LRU cache.
+##
+class PatternBank(object):
+
+    VERSION = 2
+
+    def __init__(self, maxbytes=64*1024*1024):
+        self.maxbytes = maxbytes
+        self.pats = []
+        self.hits = 0
+        self.misses = 0
+        self._stamps = {}
+        self._profs = OrderedDict()
+        self._nbytes = 0
+        self._built = set()
+        return
+
+    def __len__(self):
+        return len(self.pats)
+
+    def has(self, name, stamp):
+        return self._stamps.get(name) == stamp
+
+    def add(self, name, pat, stamp=None):
+        pat = str(pat)
+        for (i,(name1,pat1)) in enumerate(self.pats):
+            if name1 == name:
+                if pat1 != pat:
+                    self.pats[i] = (name, pat)
+                    self._remove(name)
+                break
+        else:
+            self.pats.append((name, pat))
+        self._stamps[name] = stamp
+        return
+
+    def get(self, name, pat, window):
+        k = (name, window)
+        if k in self._profs:
+            self.hits += 1
+            prof = self._profs.pop(k)
+        else:
+            self.misses += 1
+            prof = wavcorr.makematchprof16(pat, window)
+            self._nbytes += len(prof)
+            self._built.add(k)
+        self._profs[k] = prof
+        self._trim()
+        return prof
+
+    def put(self, k, prof):
+        # Adds a profile built elsewhere (e.g. by a worker process).
+        if k not in self._profs:
+            self._profs[k] = prof
+            self._nbytes += len(prof)
+            self._trim()
+        return
+
+    def pop_built(self):
+        # Returns the profiles built since the last call
+        # that are still in the cache.
+        r = [ (k, self._profs[k]) for k in self._built if k in self._profs ]
+        self._built.clear()
+        return r
+
+    def match(self, data, offset, window, minsim=-1):
+        # Patterns whose similarity is surely below minsim are
+        # not evaluated, and the offset is -1.
+        for (name,pat) in self.pats:
+            prof = self.get(name, pat, window)
+            (d, s) = wavcorr.matchprofs16(prof, data, offset, minsim)
+            yield (name, d, s)
+        return
+
+    def _trim(self):
+        while self.maxbytes < self._nbytes and 1 < len(self._profs):
+            (_,prof) = self._profs.popitem(last=False)
+            self._nbytes -= len(prof)
+        return
+
+    def _remove(self, name):
+        for k in [ k for k in self._profs if k[0] == name ]:
+            self._nbytes -= len(self._profs.pop(k))
+        return
+
+    def save(self, path):
+        obj = {
+            'version': self.VERSION,
+            'pats': [ (name, pat, self._stamps.get(name))
+                      for (name,pat) in self.pats ],
+            'profs': self._profs.items(),
+        }
+        tmppath = path+'.tmp'
+        fp = open(tmppath, 'wb')
+        pickle.dump(obj, fp, pickle.HIGHEST_PROTOCOL)
+        fp.close()
+        os.rename(tmppath, path)
+        return
+
+    @classmethod
+    def load(klass, path, maxbytes=64*1024*1024):
+        bank = klass(maxbytes=maxbytes)
+        fp = open(path, 'rb')
+        try:
+            obj = pickle.load(fp)
+        except (EOFError, pickle.UnpicklingError):
+            raise ValueError('broken pattern bank: %r' % path)
+        finally:
+            fp.close()
+        if not isinstance(obj, dict) or obj.get('version') != klass.VERSION:
+            raise ValueError('incompatible pattern bank: %r' % path)
+        for (name,pat,stamp) in obj['pats']:
+            bank.add(name, pat, stamp)
+        for (k,prof) in obj['profs']:
+            bank._profs[k] = prof
+            bank._nbytes += len(prof)
+        bank._trim()
+        return bank
 
 
 ##  WaveMatcher
 ##
 class WaveMatcher(object):
 
-    def __init__(self, threshold=0.6):
+    def __init__(self, threshold=0.6, engine=wavcorr.AUTOCORR_AUTO, bank=None, topk=0):
         self.threshold = threshold
-        self.pats = []
+        self.engine = engine
+        if bank is None:
+            bank = PatternBank()
+        self.bank = bank
+        self.topk = topk
+        self.nevals = 0
+        self.nskips = 0
         return
 
     def load_pat(self, path, name=None):
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime)
+        if self.bank.has(name or path, stamp): return
         fp = WaveReader(path)
-        (_, pat) = fp.readraw()
-        self.pats.append((name or path, pat))
+        (_, pat) = fp.reads16()
+        self.bank.add(name or path, pat, stamp)
         fp.close()
         return
 
-    def load_wav(self, wavpath, pitchpath):
-        src = WaveReader(wavpath)
-        fp = open(pitchpath)
-        for line in fp:
-            line = line.strip()
-            if not line:
-                print
-            (line,_,_) = line.partition('#')
-            if not line: continue
-            (f, _, pitch) = line.partition(' ')
-            f = int(f)
-            pitch = int(pitch)
+    def match_marks(self, src, marks):
+        for mark in marks:
+            if mark is None:
+                yield ''
+                continue
+            (f, window) = mark
             src.seek(f)
-            r = []
-            (nframes, data) = src.readraw(int(src.framerate/pitch))
-            for (name,pat) in self.pats:
-                s = wavcorr.matchs16(pat, 0, nframes, data)
+            (nframes, data) = src.reads16(window)
+            r = self.match_data(data, nframes)
+            if r:
+                yield '%d %s' % (f, ' '.join( '%.04f:%s' % (s,name) for (s,name) in r ))
+        return
+
+    def match_data(self, data, nframes):
+        # Returns the (top K) patterns above the threshold.
+        # The auto engine uses the profiles in the bank, and a pattern
+        # is skipped if the upper bound of its similarity is below
+        # the threshold or the current K-th best. The other engines
+        # evaluate every pattern with matchs16.
+        r = []
+        if self.engine != wavcorr.AUTOCORR_AUTO:
+            for (name,pat) in self.bank.pats:
+                s = wavcorr.matchs16(pat, 0, nframes, data, self.engine)
+                self.nevals += 1
                 if self.threshold <= s:
                     r.append((s, name))
-            if r:
-                r.sort(reverse=True)
-                print f, ' '.join( '%.04f:%s' % (s,name) for (s,name) in r )
-        fp.close()
+        elif nframes:
+            minsim = self.threshold
+            for (name,pat) in self.bank.pats:
+                prof = self.bank.get(name, pat, nframes)
+                (d, s) = wavcorr.matchprofs16(prof, data, 0, minsim)
+                if d < 0:
+                    self.nskips += 1
+                    continue
+                self.nevals += 1
+                if self.threshold <= s:
+                    r.append((s, name))
+                    if self.topk and self.topk <= len(r):
+                        r.sort(reverse=True)
+                        del r[self.topk:]
+                        minsim = r[-1][0]
+        r.sort(reverse=True)
+        if self.topk:
+            del r[self.topk:]
+        return r
+
+    def load_wav(self, wavpath, pitchpath, nprocs=1, chunksize=10000, keepprofs=False):
+        src = WaveReader(wavpath)
+        marks = load_pitch(pitchpath, src.framerate)
+        pool = None
+        if 1 < nprocs:
+            # The pitch marks are split into chunks, and the results
+            # are printed in the original order. With keepprofs,
+            # the profiles built by the workers are sent back
+            # and added to the bank of this process.
+            pool = multiprocessing.Pool(nprocs, init_worker,
+                                        (self, src, wavpath, keepprofs))
+            results = pool.imap(match_chunk, iterchunks(marks, chunksize))
+        else:
+            results = [(self.match_marks(src, marks), 0, 0, [])]
+        for (lines,nevals,nskips,profs) in results:
+            for line in lines:
+                print line
+            self.nevals += nevals
+            self.nskips += nskips
+            for (k,prof) in profs:
+                self.bank.put(k, prof)
+        if pool is not None:
+            pool.close()
+            pool.join()
         src.close()
         return
 
+# iterchunks: split items into lists of n items.
+def iterchunks(items, n):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if n <= len(chunk):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+    return
+
+# Worker processes are forked and share the mapped source.
+worker_matcher = None
+worker_src = None
+worker_keepprofs = False
+def init_worker(matcher, src, wavpath, keepprofs):
+    global worker_matcher, worker_src, worker_keepprofs
+    worker_matcher = matcher
+    worker_keepprofs = keepprofs
+    if src.ismapped():
+        worker_src = src
+    else:
+        worker_src = WaveReader(wavpath)
+    return
+def match_chunk(marks):
+    (nevals, nskips) = (worker_matcher.nevals, worker_matcher.nskips)
+    lines = list(worker_matcher.match_marks(worker_src, marks))
+    profs = (worker_matcher.bank.pop_built() if worker_keepprofs else [])
+    return (lines,
+            worker_matcher.nevals-nevals,
+            worker_matcher.nskips-nskips,
+            profs)
+
 
 # main
 def main(argv):
     import getopt
     def usage():
-        print 'usage: %s [-t threshold] src.wav pitch pat.wav ...' % argv[0]
+        print ('usage: %s [-v] [-t threshold] [-k topk] [-E engine]'
+               ' [-B bank] [-M maxmb] [-j nprocs] src.wav pitch pat.wav ...' % argv[0])
         return 100
     try:
-        (opts, args) = getopt.getopt(argv[1:], 't:')
+        (opts, args) = getopt.getopt(argv[1:], 'vt:k:E:B:M:j:')
     except getopt.GetoptError:
         return usage()
+    verbose = 0
     threshold = 0.6
+    topk = 0
+    engine = wavcorr.AUTOCORR_AUTO
+    bankpath = None
+    maxbytes = 64*1024*1024
+    nprocs = 1
     for (k,v) in opts:
-        if k == '-t': threshold = float(v)
+        if k == '-v': verbose += 1
+        elif k == '-t': threshold = float(v)
+        elif k == '-k': topk = int(v)
+        elif k == '-E': engine = {'auto': wavcorr.AUTOCORR_AUTO,
+                                  'direct': wavcorr.AUTOCORR_DIRECT,
+                                  'fft': wavcorr.AUTOCORR_FFT}[v]
+        elif k == '-B': bankpath = v
+        elif k == '-M': maxbytes = int(float(v)*1024*1024)
+        elif k == '-j': nprocs = int(v)
     if not args: return usage()
     wavpath = args.pop(0)
     if not args: return usage()
     pitchpath = args.pop(0)
 
-    matcher = WaveMatcher(threshold=threshold)
+    bank = None
+    if bankpath is not None and os.path.exists(bankpath):
+        try:
+            bank = PatternBank.load(bankpath, maxbytes=maxbytes)
+        except ValueError, e:
+            # A stale or broken bank is rebuilt from the pattern files.
+            print >>sys.stderr, 'stale bank, rebuilding: %s' % e
+    if bank is None:
+        bank = PatternBank(maxbytes=maxbytes)
+    matcher = WaveMatcher(threshold=threshold, engine=engine, bank=bank, topk=topk)
     for path in args:
         matcher.load_pat(path)
+    if not bank: return usage()
 
-    matcher.load_wav(wavpath, pitchpath)
+    matcher.load_wav(wavpath, pitchpath, nprocs=nprocs,
+                     keepprofs=(bankpath is not None))
+    if verbose:
+        print >>sys.stderr, ('evaluated: %d, skipped: %d' %
+                             (matcher.nevals, matcher.nskips))
+    if bankpath is not None:
+        bank.save(bankpath)
     return
 
 if __name__ == '__main__': sys.exit(main(sys.argv))
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 #
-# usage: python multimix.py [-o out.wav] src.wav [script ...]
+# usage: python multimix.py [-b blocksize] [-o out.wav] src.wav [script ...]
 #
 # script (columns delimited by a tab)
 #   0.00        1.00    sound1.wav
@@ -12,17 +12,54 @@ import sys
 from wavestream import WaveReader
 from wavestream import WaveWriter
 from wavestream import PygameWavePlayer as WavePlayer
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-def mix(bufs):
-    n = len(bufs)
-    return [ sum(row)/n for row in zip(*bufs) ]
+def mix(blocks, n, length):
+    if numpy is not None:
+        x = numpy.zeros(length)
+        for b in blocks:
+            x[:len(b)] += b
+        return x/n
+    x = [0.0]*length
+    for b in blocks:
+        for (i,v) in enumerate(b):
+            x[i] += v
+    return [ v/n for v in x ]
+
+
+##  Voice
+##
+class Voice(object):
+
+    def __init__(self, path, nframes, src):
+        self._wav = WaveReader(path)
+        assert self._wav.nchannels == src.nchannels
+        assert self._wav.sampwidth == src.sampwidth
+        #assert self._wav.framerate == src.framerate
+        if nframes == 0 or self._wav.nframes < nframes:
+            nframes = self._wav.nframes
+        self.left = nframes
+        return
+
+    def read(self, n):
+        # A finished voice stays until the end of the segment.
+        if self.left == 0: return []
+        n = min(n, self.left)
+        self.left -= n
+        block = self._wav.readblock(n)
+        if self.left == 0:
+            self._wav.close()
+        return block
 
 # main
 def main(argv):
     import getopt
     import fileinput
     def usage():
-        print 'usage: %s [-v] [-o out.wav] [script ...]' % argv[0]
+        print 'usage: %s [-v] [-b blocksize] [-o out.wav] [script ...]' % argv[0]
         return 100
     def getv(v):
         try:
@@ -33,20 +70,23 @@ def main(argv):
         except ValueError:
             return 0
     try:
-        (opts, args) = getopt.getopt(argv[1:], 'vo:')
+        (opts, args) = getopt.getopt(argv[1:], 'vb:o:')
     except getopt.GetoptError:
         return usage()
     verbose = 0
+    blocksize = 4096
     outfp = None
     for (k, v) in opts:
         if k == '-v': verbose += 1
+        elif k == '-b': blocksize = int(v)
         elif k == '-o': outfp = open(v, 'wb')
     #
     if not args: return usage()
     path = args.pop(0)
     src = WaveReader(path)
+    assert src.nchannels == 1
     #
-    waves = []
+    events = []
     for line in fileinput.input(args):
         (line,_,_) = line.partition('#')
         line = line.strip()
@@ -54,18 +94,13 @@ def main(argv):
         (t,dur,path) = line.split('\t')
         t = getv(t)
         dur = getv(dur)
-        wav = WaveReader(path)
-        assert wav.nchannels == src.nchannels
-        assert wav.sampwidth == src.sampwidth
-        #assert wav.framerate == src.framerate
         if isinstance(t, float):
             t = int(t*src.framerate)
         if isinstance(dur, float):
             dur = int(dur*src.framerate)
-        buf = wav.read(dur)
-        wav.close()
-        waves.append((t, buf))
-    waves.append((src.nframes, []))
+        events.append((t, dur, path))
+    events.sort(key=lambda (t,_,__): t)
+    events.append((src.nframes, 0, None))
     #
     if outfp is not None:
         dst = WaveWriter(outfp,
@@ -77,22 +112,27 @@ def main(argv):
                          sampwidth=src.sampwidth,
                          framerate=src.framerate)
     #
+    # Each voice is read lazily, one block at a time.
+    # The volume is divided by the number of voices that are
+    # active at the beginning of each segment between events.
     t0 = 0
-    bufs = []
-    for (t1,buf1) in sorted(waves, key=lambda (t,_): t):
-        dt = (t1-t0)*dst.nchannels
-        tmp = [src.read(t1-t0)]
-        assert len(tmp[0]) == dt
-        for (i,b) in enumerate(bufs):
-            if dt <= len(b):
-                tmp.append(b[:dt])
-            else:
-                tmp.append(b+[0]*(dt-len(b)))
-            bufs[i] = b[dt:]
-        bufs.append(buf1)
-        bufs = [ b for b in bufs if b ]
-        dst.write(mix(tmp))
-        t0 = t1
+    voices = []
+    for (t1,dur,path) in events:
+        t1 = min(t1, src.nframes)
+        n = len(voices)+1
+        while t0 < t1:
+            length = min(blocksize, t1-t0)
+            blocks = [src.readblock(length)]
+            blocks.extend( voice.read(length) for voice in voices )
+            dst.write(mix(blocks, n, length))
+            t0 += length
+        voices = [ voice for voice in voices if voice.left ]
+        if path is not None and t1 < src.nframes:
+            voice = Voice(path, dur, src)
+            if voice.left:
+                voices.append(voice)
+            if verbose:
+                print >>sys.stderr, '%d: %s (%d frames)' % (t1, path, voice.left)
     #
     dst.close()
     if outfp is not None:
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+#
+# Waveform overview index
+#
+# usage: python overview.py [-f] [-B blocksize] [-c channel] [-r start-end] [-n ncols] wav ...
+#
+# An overview is a sidecar file (wav+'.ovw') that has the min/max/RMS
+# of the blocks of a file at several levels. Each level has blocks
+# RATIO times as large as the previous one:
+#
+#   header:  'WOVW' version(H) nlevels(H) blocksize(L) ratio(L) channel(l)
+#            nframes(Q) filesize(Q) mtime(d)
+#   levels:  min(h) max(h) rms(f) for each block
+#
+# The overview is rebuilt when the size or mtime of the file changes.
+#
+
+import sys
+import os
+import mmap
+import struct
+import wavcorr
+
+MAGIC = 'WOVW'
+VERSION = 1
+HEADER = struct.Struct('<4sHHLLlQQd')
+RECORD = struct.Struct('<hhf')
+BLOCKSIZE = 256
+RATIO = 16
+DIV16 = 1.0/32768.0
+
+
+# getcounts: returns the number of blocks of each level.
+def getcounts(nframes, blocksize, ratio):
+    counts = []
+    n = (nframes+blocksize-1)/blocksize
+    while True:
+        counts.append(n)
+        if n <= 1: break
+        n = (n+ratio-1)/ratio
+    return counts
+
+# getstamp: returns (size, mtime) of a file.
+def getstamp(path):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime)
+
+
+# build_overview: makes an overview of a file in a single pass.
+def build_overview(path, wavpath, blocksize=BLOCKSIZE, ratio=RATIO,
+                   channel=-1, bufsize=1024):
+    from wavestream import WaveReader
+    (filesize, mtime) = getstamp(wavpath)
+    src = WaveReader(wavpath)
+    counts = getcounts(src.nframes, blocksize, ratio)
+    offsets = [HEADER.size]
+    for n in counts[:-1]:
+        offsets.append(offsets[-1]+n*RECORD.size)
+    tmppath = '%s.%d.tmp' % (path, os.getpid())
+    fp = open(tmppath, 'wb')
+    fp.write(HEADER.pack(MAGIC, VERSION, len(counts), blocksize, ratio, channel,
+                         src.nframes, filesize, mtime))
+    # pending[i]: the records of level i that are not merged yet.
+    pending = ['']*len(counts)
+    def push(level, recs):
+        fp.seek(offsets[level])
+        fp.write(recs)
+        offsets[level] += len(recs)
+        if level+1 < len(counts):
+            recs = pending[level+1]+recs
+            n = len(recs)/RECORD.size/ratio*ratio
+            pending[level+1] = recs[n*RECORD.size:]
+            if n:
+                push(level+1, wavcorr.mergeoverviews(recs[:n*RECORD.size], ratio))
+        return
+    while not src.eof():
+        (nframes,buf) = src.reads16(blocksize*bufsize, channel)
+        (nblocks,rest) = divmod(nframes, blocksize)
+        recs = wavcorr.overviews16(buf, 0, blocksize, nblocks)
+        if rest:
+            recs += wavcorr.overviews16(buf, nblocks*blocksize, rest, 1)
+        push(0, recs)
+    # Merge the partial blocks at the end.
+    for level in xrange(1, len(counts)):
+        if pending[level]:
+            recs = pending[level]
+            pending[level] = ''
+            push(level, wavcorr.mergeoverviews(recs, ratio))
+    fp.close()
+    src.close()
+    os.rename(tmppath, path)
+    return
+
+
+##  Overview
+##
+class Overview(object):
+
+    def __init__(self, path, src=None):
+        fp = open(path, 'rb')
+        try:
+            m = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            fp.close()
+        if len(m) < HEADER.size: raise ValueError('not an overview')
+        (magic, version, nlevels, self.blocksize, self.ratio, self.channel,
+         self.nframes, filesize, mtime) = HEADER.unpack_from(m, 0)
+        if magic != MAGIC: raise ValueError('not an overview')
+        if version != VERSION: raise ValueError('unsupported version: %r' % version)
+        self.stamp = (filesize, mtime)
+        self.counts = getcounts(self.nframes, self.blocksize, self.ratio)
+        if len(self.counts) != nlevels: raise ValueError('broken overview')
+        self._offsets = [HEADER.size]
+        for n in self.counts:
+            self._offsets.append(self._offsets[-1]+n*RECORD.size)
+        if self._offsets[-1] != len(m): raise ValueError('broken overview')
+        self._mmap = m
+        # src is used for the parts smaller than a block.
+        self._src = src
+        return
+
+    def close(self):
+        self._mmap = None
+        return
+
+    def _records(self, level, r0, r1):
+        return buffer(self._mmap, self._offsets[level]+r0*RECORD.size,
+                      (r1-r0)*RECORD.size)
+
+    def _samples(self, f0, f1):
+        if f1 <= f0: return []
+        if self._src is None:
+            # Use the whole block.
+            b = self.blocksize
+            return self._blocks(0, f0/b, (f1+b-1)/b)
+        self._src.seek(f0)
+        (n,buf) = self._src.reads16(f1-f0, self.channel)
+        (m0,m1,rms) = RECORD.unpack(wavcorr.overviews16(buf, 0, n, 1))
+        return [(m0, m1, rms, n)]
+
+    def _blocks(self, level, r0, r1):
+        # Use the coarser level for the middle part.
+        if r1 <= r0: return []
+        if level+1 < len(self.counts):
+            q0 = (r0+self.ratio-1)/self.ratio
+            q1 = r1/self.ratio
+            if q0 < q1:
+                return (self._blocks(level, r0, q0*self.ratio) +
+                        self._blocks(level+1, q0, q1) +
+                        self._blocks(level, q1*self.ratio, r1))
+        size = self.blocksize*self.ratio**level
+        rs = []
+        data = self._records(level, r0, r1)
+        for i in xrange(r1-r0):
+            (m0,m1,rms) = RECORD.unpack_from(data, i*RECORD.size)
+            n = min(size, self.nframes-(r0+i)*size)
+            rs.append((m0, m1, rms, n))
+        return rs
+
+    # query: returns (min, max, rms) of [frame0, frame1).
+    def query(self, frame0, frame1):
+        frame0 = max(0, frame0)
+        frame1 = min(frame1, self.nframes)
+        if frame1 <= frame0: return (0, 0, 0.0)
+        b = self.blocksize
+        (r0, r1) = ((frame0+b-1)/b, frame1/b)
+        if self.nframes <= frame1:
+            r1 = self.counts[0]
+        if r1 <= r0:
+            rs = self._samples(frame0, frame1)
+        else:
+            rs = (self._samples(frame0, r0*b) +
+                  self._blocks(0, r0, r1) +
+                  self._samples(r1*b, frame1))
+        m0 = min( r[0] for r in rs )
+        m1 = max( r[1] for r in rs )
+        s = sum( rms*rms*n for (_,_,rms,n) in rs )
+        n = sum( n for (_,_,_,n) in rs )
+        return (m0*DIV16, m1*DIV16, (s/n)**0.5)
+
+    # columns: returns (min, max, rms) of ncols columns in [frame0, frame1).
+    # Each column is rounded to the blocks of the finest level
+    # that has fewer blocks than pixels.
+    def columns(self, frame0, frame1, ncols):
+        frame0 = max(0, frame0)
+        frame1 = min(frame1, self.nframes)
+        span = float(frame1-frame0)/ncols
+        level = 0
+        size = self.blocksize
+        while level+1 < len(self.counts) and size*self.ratio <= span:
+            level += 1
+            size *= self.ratio
+        cols = []
+        for i in xrange(ncols):
+            (c0, c1) = (frame0+int(i*span), frame0+int((i+1)*span))
+            if size <= span:
+                (r0, r1) = (c0/size, max(c0/size+1, (c1+size-1)/size))
+                r1 = min(r1, self.counts[level])
+                data = wavcorr.mergeoverviews(self._records(level, r0, r1), r1-r0)
+                (m0,m1,rms) = RECORD.unpack(data)
+                cols.append((m0*DIV16, m1*DIV16, rms))
+            else:
+                cols.append(self.query(c0, max(c0+1, c1)))
+        return cols
+
+
+# open_overview: opens the overview of a file. It is built
+# if it does not exist or the file has been changed.
+def open_overview(wavpath, blocksize=BLOCKSIZE, ratio=RATIO, channel=-1,
+                  src=None, force=False):
+    path = wavpath+'.ovw'
+    if not force:
+        try:
+            ov = Overview(path, src)
+            if (ov.stamp == getstamp(wavpath) and ov.blocksize == blocksize and
+                ov.ratio == ratio and ov.channel == channel):
+                return ov
+            ov.close()
+        except (IOError, ValueError, mmap.error):
+            pass
+    build_overview(path, wavpath, blocksize=blocksize, ratio=ratio, channel=channel)
+    return Overview(path, src)
+
+
+# main
+def main(argv):
+    import getopt
+    import time
+    from wavestream import WaveReader
+    def usage():
+        print ('usage: %s [-f] [-B blocksize] [-c channel]'
+               ' [-r start-end] [-n ncols] wav ...' % argv[0])
+        return 100
+    try:
+        (opts, args) = getopt.getopt(argv[1:], 'fB:c:r:n:')
+    except getopt.GetoptError:
+        return usage()
+    force = False
+    blocksize = BLOCKSIZE
+    channel = -1
+    ranges = []
+    ncols = 0
+    for (k, v) in opts:
+        if k == '-f': force = True
+        elif k == '-B': blocksize = int(v)
+        elif k == '-c': channel = int(v)
+        elif k == '-r':
+            (b,_,e) = v.partition('-')
+            ranges.append((int(b or 0), int(e or sys.maxint)))
+        elif k == '-n': ncols = int(v)
+    if not args: return usage()
+    for path in args:
+        src = WaveReader(path)
+        t0 = time.time()
+        ov = open_overview(path, blocksize=blocksize, channel=channel,
+                           src=src, force=force)
+        print >>sys.stderr, ('%s: %d frames, %d levels (%.3fs)' %
+                             (path, ov.nframes, len(ov.counts), time.time()-t0))
+        for (f0,f1) in ranges:
+            (m0,m1,rms) = ov.query(f0, f1)
+            print '%s %d %d min=%.4f max=%.4f rms=%.4f' % (path, f0, min(f1, ov.nframes),
+                                                          m0, m1, rms)
+        if ncols:
+            for (f0,f1) in (ranges or [(0, ov.nframes)]):
+                for (i,(m0,m1,rms)) in enumerate(ov.columns(f0, f1, ncols)):
+                    print i, '%.4f %.4f %.4f' % (m0, m1, rms)
+        ov.close()
+        src.close()
+    return 0
+
+if __name__ == '__main__': sys.exit(main(sys.argv))
@@ -7,8 +7,15 @@
 
 import sys
 from wavestream import WaveReader
+from pitchtrack import ispitchtrack, PitchTrackReader
 
 def load_pitch(path):
+    if ispitchtrack(path):
+        track = PitchTrackReader(path)
+        for (f,_,lag,_,_) in track.best():
+            yield (f, track.framerate/lag)
+        track.close()
+        return
     fp = open(path)
     for line in fp:
         line = line.strip()
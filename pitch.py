@@ -6,7 +6,18 @@
 #
 
 import sys
+import os
+import time
+import wave
+import marshal
+import hashlib
+import multiprocessing
+from cStringIO import StringIO
+from math import log, floor
+from heapq import heappush, heappop
 import wavcorr
+from pitchtrack import PitchTrackWriter
+from vad import ActivityDetector, merge_segments, detect_activity
 
 
 ##  PitchDetector
@@ -15,33 +26,161 @@ class PitchDetector(object):
 
     def __init__(self, 
                  wmin=100, wmax=600,
-                 threshold_sim=0.75, maxitems=10):
+                 threshold_sim=0.75, maxitems=10,
+                 engine=wavcorr.AUTOCORR_AUTO, nthreads=1,
+                 bufsize=10000, cache=None):
         self.wmin = wmin
         self.wmax = wmax
         self.threshold_sim = threshold_sim
         self.maxitems = maxitems
+        self.engine = engine
+        self.nthreads = nthreads
+        self.bufsize = bufsize
+        self.cache = cache
         self.reset()
         return
 
     def reset(self):
-        self._buf = ''
+        # self._buf[_start:_end] holds the samples not analyzed yet.
+        self._buf = bytearray((self.wmax*2+self.wmin/2+self.bufsize)*2)
+        self._start = 0
+        self._end = 0
+        return
+
+    def _reserve(self, n):
+        # Move the remaining samples to the front so that
+        # n more samples can be appended.
+        length = self._end - self._start
+        if len(self._buf) < (length+n)*2:
+            # Allocate a new buffer.
+            buf = bytearray((length+n)*2)
+            buf[:length*2] = memoryview(self._buf)[self._start*2:self._end*2]
+            self._buf = buf
+        else:
+            mv = memoryview(self._buf)
+            mv[:length*2] = mv[self._start*2:self._end*2]
+        self._start = 0
+        self._end = length
         return
     
+    # feed: yields (step, pitches, data) for each hop.
+    # data is a view of the internal buffer, which is valid only
+    # until the next feed(); the samples move when it is reused.
     def feed(self, buf, nframes):
-        self._buf += buf
-        bufmax = len(self._buf)/2 - self.wmax*2
+        n = len(buf)/2
+        if len(self._buf) < (self._end+n)*2:
+            self._reserve(n)
+        mv = memoryview(self._buf)
+        mv[self._end*2:(self._end+n)*2] = buf
+        self._end += n
+        bufmax = self._end - self._start - self.wmax*2
         step = self.wmin/2
-        i = 0
-        while i < bufmax:
-            r = wavcorr.autocorrs16(
+        hops = range(self._start, self._start+max(0, bufmax), step)
+        results = None
+        if self.cache is not None and hops:
+            # The hops use the samples up to the last hop + wmax*2.
+            key = ('%d,%d,%r,%d,%d,%d,%d:' %
+                   (self.wmin, self.wmax, self.threshold_sim, self.maxitems,
+                    self.engine, step, len(hops)) +
+                   str(self._buf[hops[0]*2:(hops[-1]+self.wmax*2)*2]))
+            results = self.cache.get(key)
+        if results is None:
+            results = wavcorr.autocorrs16batch(
                 self.wmin, self.wmax,
                 self.threshold_sim, self.maxitems,
-                self._buf, i)
-            r = [ (w, sim, wavcorr.calcmags16(self._buf, i, w))
-                  for (w,sim) in r ]
-            yield (step, r, self._buf[i*2:(i+step)*2])
-            i += step
-        self._buf = self._buf[i*2:]
+                self._buf, hops, self.nthreads, self.engine)
+            if self.cache is not None and hops:
+                self.cache.put(key, results)
+        for (i,r) in zip(hops, results):
+            yield (step, r, mv[i*2:(i+step)*2])
+        self._start += len(hops)*step
+        return
+
+
+##  AnalysisCache
+##
+##  Keeps the results of PitchDetector in files named by the hash
+##  of the samples and parameters. The least recently used files
+##  are removed when the total size exceeds maxbytes.
+##  The directory can be shared by several processes. It is
+##  scanned again every maxbytes/16 bytes written, so that
+##  the limit applies to the total of all the processes.
+##
+class AnalysisCache(object):
+
+    def __init__(self, path, maxbytes=100*1024*1024):
+        self.path = path
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._scan()
+        return
+
+    def _scan(self):
+        self._files = {}
+        for name in os.listdir(self.path):
+            if not name.endswith('.hops'): continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            self._files[name] = (st.st_mtime, st.st_size)
+        self.nbytes = sum( size for (_,size) in self._files.itervalues() )
+        self._added = 0
+        return
+
+    def _getname(self, key):
+        return hashlib.sha1(key).hexdigest()+'.hops'
+
+    def get(self, key):
+        name = self._getname(key)
+        path = os.path.join(self.path, name)
+        try:
+            fp = open(path, 'rb')
+            results = marshal.load(fp)
+            fp.close()
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if name in self._files:
+            self._files[name] = (time.time(), self._files[name][1])
+        return results
+
+    def put(self, key, results):
+        name = self._getname(key)
+        path = os.path.join(self.path, name)
+        data = marshal.dumps(results)
+        tmppath = '%s.%d.tmp' % (path, os.getpid())
+        fp = open(tmppath, 'wb')
+        fp.write(data)
+        fp.close()
+        os.rename(tmppath, path)
+        if name in self._files:
+            self.nbytes -= self._files[name][1]
+        self._files[name] = (time.time(), len(data))
+        self.nbytes += len(data)
+        self._added += len(data)
+        # The other processes may have added files in the meantime.
+        if self.maxbytes < self.nbytes or self.maxbytes/16 < self._added:
+            self._evict()
+        return
+
+    def _evict(self):
+        # Remove the oldest files down to 90% of maxbytes.
+        self._scan()
+        if self.nbytes <= self.maxbytes: return
+        for (name,(_,size)) in sorted(self._files.items(), key=lambda (_,v): v[0]):
+            if self.nbytes <= self.maxbytes*0.9: break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            del self._files[name]
+            self.nbytes -= size
         return
 
 
@@ -52,35 +191,65 @@ class PitchSmoother(object):
     def __init__(self, windowsize, 
                  threshold_sim=0.75,
                  threshold_mag=0.025,
-                 pitch_ratio=1.2):
+                 pitch_ratio=1.2,
+                 maxstreak=100):
+        assert 1.0 < pitch_ratio
         self.windowsize = windowsize
         self.threshold_sim = threshold_sim
         self.threshold_mag = threshold_mag
         self.pitch_ratio = pitch_ratio
+        self.maxstreak = maxstreak
+        self._logratio = log(pitch_ratio)
         self._threads = []  # [(w0,score0,t0), (w1,score1,t1), ...]
         self._streak = []
+        self._instreak = False
         return
 
+    def _bucket(self, w):
+        # Two lags within pitch_ratio are in the same or adjacent buckets.
+        return int(floor(log(w)/self._logratio))
+
+    # feed: yields (streak, done) when a streak ends (done=True)
+    # or has more than maxstreak hops (done=False).
     def feed(self, bt, n, pitches):
         pitches = [ (w,sim,mag) for (w,sim,mag) in pitches 
                     if self.threshold_sim < sim and self.threshold_mag < mag ]
         threads = ([ (w,0,score,t) for (w,score,t) in self._threads ] +
                    [ (w,sim,0,bt) for (w,sim,_) in pitches ])
+        buckets = {}
+        for (i,(w,_,_,_)) in enumerate(threads):
+            buckets.setdefault(self._bucket(w), []).append(i)
+        alive = [True]*len(threads)
         self._threads = []
         r = []
         for (i,(w0,sim0,score0,t0)) in enumerate(threads):
-            i += 1
-            while i < len(threads):
-                (w1,sim1,score1,t1) = threads[i]
+            if not alive[i]: continue
+            # Visit the following threads near w0 in order, as w0 moves.
+            queue = []
+            visited = set()
+            b0 = None
+            j = i
+            while True:
+                b1 = self._bucket(w0)
+                if b1 != b0:
+                    b0 = b1
+                    for b in (b0-1, b0, b0+1):
+                        if b in visited or b not in buckets: continue
+                        visited.add(b)
+                        for k in buckets[b]:
+                            if j < k and alive[k]:
+                                heappush(queue, k)
+                if not queue: break
+                j = heappop(queue)
+                if not alive[j]: continue
+                (w1,sim1,score1,t1) = threads[j]
                 if w1 <= w0*self.pitch_ratio and w0 <= w1*self.pitch_ratio:
                     if sim0 < sim1:
                         w0 = w1
                     sim0 = max(sim0, sim1)
                     score0 = max(score0, score1)
                     t0 = max(t0, t1)
-                    del threads[i]
-                else:
-                    i += 1
+                    alive[j] = False
             if (bt-t0) < self.windowsize:
                 score0 += sim0
                 self._threads.append((w0,score0,t0))
@@ -88,19 +257,235 @@ class PitchSmoother(object):
         if r:
             r.sort(reverse=True)
             self._streak.append((bt,n,r))
-        elif self._streak:
-            yield self._streak
+            self._instreak = True
+            if self.maxstreak and self.maxstreak <= len(self._streak):
+                yield (self._streak, False)
+                self._streak = []
+        elif self._instreak:
+            yield (self._streak, True)
+            self._streak = []
+            self._instreak = False
+        return
+
+    def flush(self):
+        if self._instreak:
+            yield (self._streak, True)
             self._streak = []
+            self._instreak = False
         return
 
 
+# print_streaks: writes the streaks in the text format.
+def print_streaks(out, streaks):
+    for (streak,done) in streaks:
+        for (i1,n1,spitches) in streak:
+            print >>out, i1, n1, ' '.join( '%d:%.4f' % (w, sim)
+                                           for (_,w,sim) in spitches )
+        if done:
+            print >>out
+    return
+
+# analyze: writes the pitches of a file to out.
+def analyze(out, path, ranges,
+            pitchmin=70, pitchmax=400,
+            threshold_sim=0.75, threshold_mag=0.025,
+            engine=wavcorr.AUTOCORR_AUTO, nthreads=1,
+            bufsize=10000, maxstreak=100, debug=0,
+            binary=False, channel=-1, activity=False, cache=None):
+    from wavestream import WaveReader
+    def show_streaks(streaks):
+        print_streaks(out, streaks)
+        return
+    def write_streaks(streaks):
+        for (streak,done) in streaks:
+            for (i1,n1,spitches) in streak:
+                for (_,w,sim) in spitches:
+                    writer.write(i1, n1, w, sim, nstreaks[0])
+            if done:
+                nstreaks[0] += 1
+        return
+    if not binary:
+        print >>out, '#', path, ranges
+    src = WaveReader(path)
+    if src.nchannels <= channel: raise ValueError('invalid channel: %r' % channel)
+    framerate = src.framerate
+    if binary:
+        writer = PitchTrackWriter(out, framerate)
+        nstreaks = [0]
+        (show_streaks, out) = (write_streaks, sys.stderr)
+    detector = PitchDetector(wmin=framerate/pitchmax,
+                             wmax=framerate/pitchmin,
+                             threshold_sim=threshold_sim,
+                             engine=engine,
+                             nthreads=nthreads,
+                             bufsize=bufsize,
+                             cache=cache)
+    smoother = PitchSmoother(2*framerate/pitchmin,
+                             threshold_sim=threshold_sim,
+                             threshold_mag=threshold_mag,
+                             maxstreak=maxstreak)
+    if activity:
+        vad = ActivityDetector(max(1, framerate/100), threshold_peak=threshold_mag)
+    total = 0
+    for (b,e) in ranges:
+        if e == 0:
+            e = src.nframes
+        if activity:
+            # A hop can pass threshold_mag only if its window
+            # [i, i+lag) has a sample above it. Each active part is
+            # extended by the window, the detector delay and the
+            # smoother window, and aligned to the hops from b,
+            # so the result is the same as the whole range.
+            step = detector.wmin/2
+            segs = detect_activity(src, b, e, vad, channel)
+            segs = merge_segments(segs, detector.wmax+step,
+                                  smoother.windowsize+detector.wmax*2+step*2)
+            parts = list(merge_segments( (b+max(0, s-b)/step*step, min(e, t))
+                                         for (s,t) in segs ))
+            total += min(e, src.nframes)-b
+        else:
+            parts = [(b,e)]
+        for (b,e) in parts:
+            if activity:
+                detector.reset()
+            src.seek(b)
+            length = e-b
+            i0 = b
+            while length:
+                (nframes,buf) = src.reads16(min(bufsize, length), channel)
+                if not nframes: break
+                length -= nframes
+                if not activity:
+                    total += nframes
+                seq = detector.feed(buf, nframes)
+                for (n0,pitches,data) in seq:
+                    if debug:
+                        print >>out, ('# %d: %r' % (n0, pitches))
+                    show_streaks(smoother.feed(i0, n0, pitches))
+                    i0 += n0
+    show_streaks(smoother.flush())
+    if binary:
+        writer.close()
+    src.close()
+    return (total, framerate)
+
+# analyze_job: runs analyze() and returns the result, timing and
+# the cache statistics (hits, misses).
+# If outpath is None, the output is returned as a string
+# unless out is given.
+# The cache is opened once per process.
+worker_cache = None
+def init_worker(cachedir, cachesize):
+    global worker_cache
+    if cachedir is not None:
+        worker_cache = AnalysisCache(cachedir, cachesize*1024*1024)
+    return
+def analyze_job(job, out=None):
+    (path, ranges, outpath, params) = job
+    params = params.copy()
+    cachedir = params.pop('cachedir', None)
+    cachesize = params.pop('cachesize', 100)
+    t0 = time.time()
+    (fp, text, cache) = (None, None, None)
+    (hits, misses) = (0, 0)
+    try:
+        if cachedir is not None:
+            if worker_cache is None:
+                init_worker(cachedir, cachesize)
+            cache = worker_cache
+            (hits, misses) = (cache.hits, cache.misses)
+            params['cache'] = cache
+        if outpath is not None:
+            fp = open(outpath, 'wb')
+        elif out is not None:
+            fp = out
+        else:
+            fp = StringIO()
+        (nframes, framerate) = analyze(fp, path, ranges, **params)
+        error = None
+    except (ValueError, EOFError, EnvironmentError, wave.Error), e:
+        (nframes, framerate) = (0, 0)
+        error = str(e)
+    if outpath is not None:
+        if fp is not None:
+            fp.close()
+    elif out is None:
+        text = fp.getvalue()
+    stats = ((cache.hits-hits, cache.misses-misses) if cache is not None else (0, 0))
+    return (path, text, nframes, framerate, time.time()-t0, error, stats)
+
+# track_live: analyzes raw 16-bit mono samples from fp as they arrive.
+# Each hop is written as soon as it is analyzed. Its latency is the
+# delay of the detector plus the time spent after the samples arrived.
+# A hop over the latency budget, or a read that fills the whole budget
+# (i.e. the input is backing up), is counted as an overrun.
+def track_live(fp, out, framerate, latency=0.1, verbose=0,
+               pitchmin=70, pitchmax=400,
+               threshold_sim=0.75, threshold_mag=0.025,
+               engine=wavcorr.AUTOCORR_AUTO, nthreads=1):
+    detector = PitchDetector(wmin=framerate/pitchmax,
+                             wmax=framerate/pitchmin,
+                             threshold_sim=threshold_sim,
+                             engine=engine,
+                             nthreads=nthreads,
+                             bufsize=max(1, int(framerate*latency)))
+    smoother = PitchSmoother(2*framerate/pitchmin,
+                             threshold_sim=threshold_sim,
+                             threshold_mag=threshold_mag,
+                             maxstreak=1)
+    delay = float(detector.wmax*2+detector.wmin/2)/framerate
+    if latency <= delay:
+        print >>sys.stderr, ('warning: latency budget %.1fms is shorter than'
+                             ' the detector delay %.1fms' % (latency*1000, delay*1000))
+    readsize = detector.bufsize*2
+    fd = fp.fileno()
+    (i0, rest) = (0, '')
+    (nhops, total, maxdt) = (0, 0.0, 0.0)
+    (nlate, nbacklog) = (0, 0)
+    while True:
+        data = os.read(fd, readsize)
+        t0 = time.time()
+        if not data: break
+        if len(data) == readsize:
+            nbacklog += 1
+            if verbose:
+                print >>sys.stderr, 'overrun at %d: input is backing up' % i0
+        data = rest+data
+        n = len(data)/2
+        (data, rest) = (data[:n*2], data[n*2:])
+        if not n: continue
+        for (n0,pitches,_) in detector.feed(data, n):
+            print_streaks(out, smoother.feed(i0, n0, pitches))
+            out.flush()
+            dt = time.time()-t0
+            nhops += 1
+            total += dt
+            maxdt = max(maxdt, dt)
+            if latency < delay+dt:
+                nlate += 1
+                if verbose:
+                    print >>sys.stderr, ('overrun at %d: latency %.1fms' %
+                                         (i0, (delay+dt)*1000))
+            if 2 <= verbose:
+                print >>sys.stderr, ('hop %d: processing %.2fms, latency %.1fms' %
+                                     (i0, dt*1000, (delay+dt)*1000))
+            i0 += n0
+    print_streaks(out, smoother.flush())
+    out.flush()
+    print >>sys.stderr, ('%d hops, detector delay %.1fms, processing avg %.2fms max %.2fms,'
+                         ' %d late hops, %d input overruns' %
+                         (nhops, delay*1000, total*1000/max(1, nhops), maxdt*1000,
+                          nlate, nbacklog))
+    return (nlate+nbacklog)
+
 # main
 def main(argv):
     import getopt
-    from wavestream import WaveReader
     def usage():
-        print ('usage: %s [-d] [-M|-F] [-n pitchmin] [-m pitchmax]'
-               ' [-T threshold_sim] [-S threshold_mag] wav ...' % argv[0])
+        print ('usage: %s [-d] [-v] [-M|-F] [-n pitchmin] [-m pitchmax]'
+               ' [-T threshold_sim] [-S threshold_mag] [-E engine] [-j nthreads] [-c channel]'
+               ' [-A] [-L maxstreak] [-P nprocs] [-o outdir] [-b] [-C cachedir [-Z maxmb]]'
+               ' [-R framerate [-l latency]] wav ...' % argv[0])
         return 100
     def parse_range(x):
         (b,_,e) = x.partition('-')
@@ -114,63 +499,103 @@ def main(argv):
             e = 0
         return (b,e)
     try:
-        (opts, args) = getopt.getopt(argv[1:], 'dMFn:m:T:S:')
+        (opts, args) = getopt.getopt(argv[1:], 'dvMFn:m:T:S:E:j:c:AL:P:o:bR:l:C:Z:')
     except getopt.GetoptError:
         return usage()
-    debug = 0
-    pitchmin = 70
-    pitchmax = 400
-    threshold_sim = 0.75
-    threshold_mag = 0.025
-    bufsize = 10000
+    verbose = 0
+    nprocs = 1
+    outdir = None
+    rawrate = None
+    latency = 0.1
+    params = dict(debug=0, pitchmin=70, pitchmax=400,
+                  threshold_sim=0.75, threshold_mag=0.025,
+                  bufsize=10000, engine=wavcorr.AUTOCORR_AUTO,
+                  nthreads=1, maxstreak=100, binary=False, channel=-1, activity=False,
+                  cachedir=None, cachesize=100)
     for (k, v) in opts:
-        if k == '-d': debug += 1
-        elif k == '-M': (pitchmin,pitchmax) = (75,200) # male voice
-        elif k == '-F': (pitchmin,pitchmax) = (150,300) # female voice
-        elif k == '-n': pitchmin = int(v)
-        elif k == '-m': pitchmax = int(v)
-        elif k == '-T': threshold_sim = float(v)
-        elif k == '-S': threshold_mag = float(v)
-    detector = None
-    smoother = None
+        if k == '-d': params['debug'] += 1
+        elif k == '-v': verbose += 1
+        elif k == '-M': params.update(pitchmin=75, pitchmax=200) # male voice
+        elif k == '-F': params.update(pitchmin=150, pitchmax=300) # female voice
+        elif k == '-n': params['pitchmin'] = int(v)
+        elif k == '-m': params['pitchmax'] = int(v)
+        elif k == '-T': params['threshold_sim'] = float(v)
+        elif k == '-S': params['threshold_mag'] = float(v)
+        elif k == '-E': params['engine'] = {'auto': wavcorr.AUTOCORR_AUTO,
+                                            'direct': wavcorr.AUTOCORR_DIRECT,
+                                            'fft': wavcorr.AUTOCORR_FFT}[v]
+        elif k == '-j': params['nthreads'] = int(v)
+        elif k == '-c': params['channel'] = int(v)
+        elif k == '-A': params['activity'] = True
+        elif k == '-L': params['maxstreak'] = int(v)
+        elif k == '-P': nprocs = int(v)
+        elif k == '-o': outdir = v
+        elif k == '-b': params['binary'] = True
+        elif k == '-R': rawrate = int(v)
+        elif k == '-l': latency = float(v)
+        elif k == '-C': params['cachedir'] = v
+        elif k == '-Z': params['cachesize'] = int(v)
+    if params['binary'] and outdir is None: return usage()
+    if rawrate is not None:
+        # Live mode: raw samples from stdin or a FIFO.
+        path = (args[0] if args else '-')
+        fp = (sys.stdin if path == '-' else open(path, 'rb'))
+        live = dict( (k,params[k]) for k in
+                     ('pitchmin', 'pitchmax', 'threshold_sim', 'threshold_mag',
+                      'engine', 'nthreads') )
+        nerrors = track_live(fp, sys.stdout, rawrate, latency=latency,
+                             verbose=verbose, **live)
+        return (1 if nerrors else 0)
+    jobs = []
     for arg1 in args:
         (path,_,ranges) = arg1.partition(':')
         ranges = [ parse_range(x) for x in ranges.split(',') if x ]
         if not ranges:
             ranges.append((0,0))
-        print '#', path, ranges
-        src = WaveReader(path)
-        if src.nchannels != 1: raise ValueError('invalid number of channels')
-        if src.sampwidth != 2: raise ValueError('invalid sampling width')
-        framerate = src.framerate
-        if detector is None:
-            detector = PitchDetector(wmin=framerate/pitchmax,
-                                     wmax=framerate/pitchmin,
-                                     threshold_sim=threshold_sim)
-            smoother = PitchSmoother(2*framerate/pitchmin,
-                                     threshold_sim=threshold_sim,
-                                     threshold_mag=threshold_mag)
-        for (b,e) in ranges:
-            if e == 0:
-                e = src.nframes
-            src.seek(b)
-            length = e-b
-            i0 = b
-            while length:
-                (nframes,buf) = src.readraw(min(bufsize, length))
-                if not nframes: break
-                length -= nframes
-                seq = detector.feed(buf, nframes)
-                for (n0,pitches,data) in seq:
-                    if debug:
-                        print ('# %d: %r' % (n0, pitches))
-                    for streak in smoother.feed(i0, n0, pitches):
-                        for (i1,n1,spitches) in streak:
-                            print i1, n1, ' '.join( '%d:%.4f' % (w, sim)
-                                                    for (_,w,sim) in spitches )
-                        print
-                    i0 += n0
-        src.close()
-    return
+        outpath = None
+        if outdir is not None:
+            (name,_) = os.path.splitext(os.path.basename(path))
+            ext = ('.ptrk' if params['binary'] else '.pitch')
+            outpath = os.path.join(outdir, name+ext)
+        jobs.append((path, ranges, outpath, params))
+    # Each file is analyzed with its own detector.
+    # Without -o, the outputs are written to stdout in order.
+    if 1 < nprocs:
+        pool = multiprocessing.Pool(nprocs, init_worker,
+                                    (params['cachedir'], params['cachesize']))
+        results = pool.imap(analyze_job, jobs)
+    else:
+        pool = None
+        results = ( analyze_job(job, sys.stdout) for job in jobs )
+    t0 = time.time()
+    (nfiles, nerrors, duration) = (0, 0, 0.0)
+    (nhits, nmisses) = (0, 0)
+    for (path,text,nframes,framerate,elapsed,error,(hits,misses)) in results:
+        nhits += hits
+        nmisses += misses
+        if text is not None:
+            sys.stdout.write(text)
+        if error is not None:
+            print >>sys.stderr, '%s: error: %s' % (path, error)
+            nerrors += 1
+            continue
+        nfiles += 1
+        if nframes:
+            duration += float(nframes)/framerate
+            if verbose:
+                print >>sys.stderr, ('%s: %.1fs in %.2fs (%.1fx realtime)' %
+                                     (path, float(nframes)/framerate, elapsed,
+                                      float(nframes)/framerate/max(elapsed, 1e-6)))
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if verbose:
+        elapsed = time.time()-t0
+        print >>sys.stderr, ('%d files, %.1fs in %.2fs (%.1fx realtime), %d errors' %
+                             (nfiles, duration, elapsed,
+                              duration/max(elapsed, 1e-6), nerrors))
+        if params['cachedir'] is not None:
+            print >>sys.stderr, ('cache: %d hits, %d misses' % (nhits, nmisses))
+    return (1 if nerrors else 0)
 
 if __name__ == '__main__': sys.exit(main(sys.argv))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Pitch detector benchmark
+#
+# usage: python pitchbench.py [-r framerate] [-t seconds] [-n pitchmin] [-m pitchmax] [-E engine] [-j nthreads]
+#
+
+import sys
+import time
+import array
+import random
+import resource
+from math import sin, pi
+import wavcorr
+from pitch import PitchDetector, PitchSmoother
+
+
+# gen_voice: generates bufsize frames of a synthetic voice.
+def gen_voice(framerate, bufsize, nchunks=10):
+    chunks = []
+    phase = 0.0
+    for c in xrange(nchunks):
+        freq = random.uniform(100, 250)
+        voiced = (c % 3 != 2)
+        a = array.array('h')
+        for i in xrange(bufsize):
+            phase += 2*pi*freq/framerate
+            if voiced:
+                x = 0.3*sin(phase)+0.2*sin(2*phase)+0.1*sin(3*phase)
+            else:
+                x = 0.0
+            x += random.uniform(-0.01, 0.01)
+            a.append(int(x*32767))
+        chunks.append(a.tostring())
+    return chunks
+
+# main
+def main(argv):
+    import getopt
+    def usage():
+        print ('usage: %s [-r framerate] [-t seconds]'
+               ' [-n pitchmin] [-m pitchmax] [-E engine] [-j nthreads]' % argv[0])
+        return 100
+    try:
+        (opts, args) = getopt.getopt(argv[1:], 'r:t:n:m:E:j:')
+    except getopt.GetoptError:
+        return usage()
+    framerate = 16000
+    duration = 3600
+    pitchmin = 70
+    pitchmax = 400
+    engine = wavcorr.AUTOCORR_AUTO
+    nthreads = 1
+    bufsize = 10000
+    for (k, v) in opts:
+        if k == '-r': framerate = int(v)
+        elif k == '-t': duration = float(v)
+        elif k == '-n': pitchmin = int(v)
+        elif k == '-m': pitchmax = int(v)
+        elif k == '-E': engine = {'auto': wavcorr.AUTOCORR_AUTO,
+                                  'direct': wavcorr.AUTOCORR_DIRECT,
+                                  'fft': wavcorr.AUTOCORR_FFT}[v]
+        elif k == '-j': nthreads = int(v)
+    detector = PitchDetector(wmin=framerate/pitchmax,
+                             wmax=framerate/pitchmin,
+                             engine=engine,
+                             nthreads=nthreads,
+                             bufsize=bufsize)
+    smoother = PitchSmoother(2*framerate/pitchmin)
+    chunks = gen_voice(framerate, bufsize)
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    nframes = int(duration*framerate)
+    length = nframes
+    npitches = 0
+    i0 = 0
+    t0 = time.time()
+    i = 0
+    while length:
+        buf = chunks[i % len(chunks)]
+        n = min(bufsize, length)
+        if n < bufsize:
+            buf = buf[:n*2]
+        length -= n
+        i += 1
+        for (n0,pitches,_) in detector.feed(buf, n):
+            for (streak,_) in smoother.feed(i0, n0, pitches):
+                npitches += len(streak)
+            i0 += n0
+    elapsed = time.time() - t0
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print ('frames=%d, duration=%.1fs, elapsed=%.3fs, realtime=%.1fx, '
+           'throughput=%.0f frames/s, pitches=%d' %
+           (nframes, duration, elapsed, duration/elapsed,
+            nframes/elapsed, npitches))
+    print ('peak RSS: %dKB (%dKB before feeding)' % (rss1, rss0))
+    return 0
+
+if __name__ == '__main__': sys.exit(main(sys.argv))
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Binary pitch track format
+#
+# A pitch track consists of a header, fixed-size records,
+# a sparse frame index and a trailer:
+#
+#   header:  'PTRK' version(H) reserved(H) framerate(L)
+#   record:  frame(q) n(H) lag(H) sim(d) streak(L)
+#   index:   frame(q) recno(Q) for every INDEXSTEP records
+#   trailer: nrecs(Q) nindex(Q) flags(L) 'PTRK'
+#
+# Records are in the order pitch.py emits them: for each hop,
+# the candidates are sorted from the best one.
+# The trailer is at the end so that a track can be written to a pipe.
+#
+
+import sys
+import mmap
+import struct
+from bisect import bisect_left
+
+MAGIC = 'PTRK'
+VERSION = 1
+HEADER = struct.Struct('<4sHHL')
+RECORD = struct.Struct('<qHHdL')
+INDEX = struct.Struct('<qQ')
+TRAILER = struct.Struct('<QQL4s')
+INDEXSTEP = 256
+FLAG_SORTED = 1
+
+
+# ispitchtrack: returns True if the file is a binary pitch track.
+def ispitchtrack(path):
+    fp = open(path, 'rb')
+    magic = fp.read(4)
+    fp.close()
+    return (magic == MAGIC)
+
+
+##  PitchTrackWriter
+##
+class PitchTrackWriter(object):
+
+    def __init__(self, fp, framerate):
+        self._fp = fp
+        self._index = []
+        self._nrecs = 0
+        self._last = None
+        self._sorted = True
+        self._fp.write(HEADER.pack(MAGIC, VERSION, 0, framerate))
+        return
+
+    def write(self, frame, n, lag, sim, streak=0):
+        if self._last is not None and frame < self._last:
+            self._sorted = False
+        self._last = frame
+        if self._nrecs % INDEXSTEP == 0:
+            self._index.append((frame, self._nrecs))
+        self._fp.write(RECORD.pack(frame, n, lag, sim, streak))
+        self._nrecs += 1
+        return
+
+    def close(self):
+        for (frame, recno) in self._index:
+            self._fp.write(INDEX.pack(frame, recno))
+        flags = (FLAG_SORTED if self._sorted else 0)
+        self._fp.write(TRAILER.pack(self._nrecs, len(self._index), flags, MAGIC))
+        return
+
+
+##  PitchTrackReader
+##
+class PitchTrackReader(object):
+
+    def __init__(self, path):
+        fp = open(path, 'rb')
+        try:
+            m = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            fp.close()
+        if len(m) < HEADER.size+TRAILER.size: raise ValueError('not a pitch track')
+        (magic, version, _, self.framerate) = HEADER.unpack_from(m, 0)
+        if magic != MAGIC: raise ValueError('not a pitch track')
+        if version != VERSION: raise ValueError('unsupported version: %r' % version)
+        (self.nrecs, nindex, flags, magic) = TRAILER.unpack_from(m, len(m)-TRAILER.size)
+        if magic != MAGIC: raise ValueError('truncated pitch track')
+        self.sorted = bool(flags & FLAG_SORTED)
+        self._indexpos = HEADER.size+self.nrecs*RECORD.size
+        if self._indexpos+nindex*INDEX.size+TRAILER.size != len(m):
+            raise ValueError('broken pitch track')
+        self._frames = [ INDEX.unpack_from(m, self._indexpos+i*INDEX.size)[0]
+                         for i in xrange(nindex) ]
+        self._mmap = m
+        return
+
+    def __len__(self):
+        return self.nrecs
+
+    def close(self):
+        self._mmap = None
+        return
+
+    def _iter(self, start):
+        m = self._mmap
+        pos = HEADER.size+start*RECORD.size
+        while pos < self._indexpos:
+            yield RECORD.unpack_from(m, pos)
+            pos += RECORD.size
+        return
+
+    # __iter__: yields (frame, n, lag, sim, streak).
+    def __iter__(self):
+        return self._iter(0)
+
+    # query: yields the records whose frame is in [frame0, frame1).
+    def query(self, frame0, frame1):
+        start = 0
+        if self.sorted:
+            i = bisect_left(self._frames, frame0)
+            start = max(0, i-1)*INDEXSTEP
+        for rec in self._iter(start):
+            frame = rec[0]
+            if frame < frame0: continue
+            if frame1 <= frame:
+                if self.sorted: break
+                continue
+            yield rec
+        return
+
+    # best: yields the best record of each hop.
+    def best(self, frame0=0, frame1=sys.maxint):
+        last = None
+        for rec in self.query(frame0, frame1):
+            if rec[0] != last:
+                yield rec
+            last = rec[0]
+        return
+
+
+# main
+def main(argv):
+    import getopt
+    def usage():
+        print 'usage: %s [-r start-end] track ...' % argv[0]
+        return 100
+    try:
+        (opts, args) = getopt.getopt(argv[1:], 'r:')
+    except getopt.GetoptError:
+        return usage()
+    (frame0, frame1) = (0, sys.maxint)
+    for (k, v) in opts:
+        if k == '-r':
+            (b,_,e) = v.partition('-')
+            if b: frame0 = int(b)
+            if e: frame1 = int(e)
+    if not args: return usage()
+    # Converts the tracks to the text format.
+    for path in args:
+        track = PitchTrackReader(path)
+        print '#', path, [(frame0, frame1)]
+        (last, streak, pitches) = (None, None, [])
+        for (frame,n,lag,sim,s) in track.query(frame0, frame1):
+            if last is not None and last[0] != frame:
+                print last[0], last[1], ' '.join( '%d:%.4f' % x for x in pitches )
+                pitches = []
+            if streak is not None and streak != s:
+                print
+            pitches.append((lag, sim))
+            (last, streak) = ((frame, n), s)
+        if last is not None:
+            print last[0], last[1], ' '.join( '%d:%.4f' % x for x in pitches )
+            print
+        track.close()
+    return 0
+
+if __name__ == '__main__': sys.exit(main(sys.argv))
@@ -6,10 +6,33 @@ def flush(p):
     plt.plot([ x for (x,_) in p ], [ y for (_,y) in p ], 'o')
     return
 
+# plot_wave: draws the waveform of a file behind the points.
+def plot_wave(path, ncols):
+    from overview import open_overview
+    ov = open_overview(path)
+    cols = ov.columns(0, ov.nframes, ncols)
+    x = [ i*ov.nframes/ncols for i in xrange(ncols) ]
+    ax = plt.gca().twinx()
+    ax.fill_between(x, [ m0 for (m0,_,_) in cols ], [ m1 for (_,m1,_) in cols ],
+                    color='0.8', zorder=0)
+    ov.close()
+    return
+
 def main(argv):
+    import getopt
     import fileinput
+    try:
+        (opts, args) = getopt.getopt(argv[1:], 'w:n:')
+    except getopt.GetoptError:
+        print 'usage: %s [-w wav [-n ncols]] [file ...]' % argv[0]
+        return 100
+    wavpath = None
+    ncols = 2000
+    for (k, v) in opts:
+        if k == '-w': wavpath = v
+        elif k == '-n': ncols = int(v)
     p = []
-    for line in fileinput.input():
+    for line in fileinput.input(args):
         line = line.strip()
         if not line:
             flush(p)
@@ -18,6 +41,8 @@ def main(argv):
             (f1,_,f2) = line.partition(' ')
             p.append((int(f1), int(f2)))
     flush(p)
+    if wavpath is not None:
+        plot_wave(wavpath, ncols)
     plt.show()
     return 0
 
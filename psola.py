@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+#
+# PSOLA time-stretch and pitch-shift
+#
+# usage: python psola.py [-v] [-t tempo] [-p pitch] [-n pitchmin] [-m pitchmax] [-c channel] [-b blocksize] [-o out.wav] wav
+#
+
+import sys
+import time
+from collections import deque
+import wavcorr
+from pitch import PitchDetector
+
+
+##  PSOLA
+##
+##  Rearranges pitch periods of 16-bit mono samples.
+##  The output is made of grains, each of which is a period of
+##  the input resampled by the pitch ratio. A grain is crossfaded
+##  from the continuation of the previous grain to the period at
+##  the current position (output position * tempo). When they are
+##  more than half a period apart, the period is aligned to the
+##  previous grain with autosplices16.
+##
+class PSOLA(object):
+
+    def __init__(self, framerate, tempo=1.0, pitch=1.0,
+                 pitchmin=70, pitchmax=400,
+                 threshold_sim=0.75, threshold_mag=0.025,
+                 engine=wavcorr.AUTOCORR_AUTO, bufsize=10000):
+        self.tempo = tempo
+        self.pitch = pitch
+        self.threshold_mag = threshold_mag
+        self.detector = PitchDetector(wmin=framerate/pitchmax,
+                                      wmax=framerate/pitchmin,
+                                      threshold_sim=threshold_sim,
+                                      maxitems=1,
+                                      engine=engine,
+                                      bufsize=bufsize)
+        # Unvoiced parts are cut into 10ms grains.
+        self.period0 = max(1, framerate/100)
+        self.nsplices = 0
+        # self._buf holds the input samples from _base to _end.
+        self._buf = bytearray()
+        self._base = 0
+        self._end = 0
+        # self._lags holds (frame, lag) of the analyzed hops.
+        self._lags = deque()
+        self._analyzed = 0
+        self._lastlag = self.period0
+        # Continuation of the previous grain.
+        self._cont = 0
+        # Output position (in frames and exact time).
+        self._out = 0
+        self._t = 0.0
+        # The grains are written to _outbuf[:_outpos].
+        self._outbuf = bytearray(bufsize*2)
+        self._outpos = 0
+        return
+
+    def _getlag(self, i):
+        lags = self._lags
+        while 2 <= len(lags) and lags[1][0] <= i:
+            lags.popleft()
+        if lags and lags[0][0] <= i < self._analyzed:
+            return lags[0][1]
+        # Beyond the analyzed part (at the end of the input).
+        return self._lastlag
+
+    def _grains(self, final=False):
+        wmax = self.detector.wmax
+        while True:
+            p = int(self._out*self.tempo)
+            if not final and self._analyzed <= p: break
+            lag = self._getlag(p)
+            c = self._cont
+            if abs(c-p) <= lag/2:
+                # The previous grain continues naturally.
+                q = c
+            elif self._base <= c-lag*2 and self._base <= p-lag*3/2:
+                # Find the period around p that continues the previous grain:
+                # buf[p0:p0+w] is most similar to buf[c-w:c].
+                p0 = p-lag*3/2
+                if self._end < p0+lag*2: break
+                b = self._base
+                (w,_) = wavcorr.autosplices16(
+                    lag, lag*2,
+                    memoryview(self._buf)[(c-lag*2-b)*2:(c-b)*2],
+                    memoryview(self._buf)[(p0-b)*2:(p0+lag*2-b)*2])
+                q = p0+w
+                self.nsplices += 1
+            else:
+                q = p
+            if self._end < max(q, c)+lag: break
+            self._t += float(lag)/self.pitch
+            n = int(self._t)-self._out
+            if 0 < n:
+                if len(self._outbuf) < (self._outpos+n)*2:
+                    if self._outpos:
+                        yield memoryview(self._outbuf)[:self._outpos*2].tobytes()
+                        self._outpos = 0
+                    if len(self._outbuf) < n*2:
+                        self._outbuf = bytearray(n*2)
+                b = self._base
+                wavcorr.psolas16into(self._outbuf, self._outpos, n,
+                                     c-b, lag, self._buf, q-b, lag, self._buf)
+                self._outpos += n
+            self._out += n
+            self._cont = q+lag
+        if self._outpos:
+            yield memoryview(self._outbuf)[:self._outpos*2].tobytes()
+            self._outpos = 0
+        # Discard the samples that are no longer needed.
+        base = min(self._cont, int(self._out*self.tempo))-wmax*2
+        if self.detector.bufsize <= base-self._base:
+            del self._buf[:(base-self._base)*2]
+            self._base = base
+        return
+
+    # feed: yields the output samples.
+    def feed(self, buf, nframes):
+        self._buf.extend(buf)
+        self._end += nframes
+        for (n0,pitches,_) in self.detector.feed(buf, nframes):
+            if pitches and self.threshold_mag <= pitches[0][2]:
+                lag = pitches[0][0]
+            else:
+                lag = self.period0
+            self._lags.append((self._analyzed, lag))
+            self._analyzed += n0
+            self._lastlag = lag
+        return self._grains()
+
+    # flush: yields the remaining output samples.
+    def flush(self):
+        return self._grains(final=True)
+
+
+# main
+def main(argv):
+    import getopt
+    from wavestream import WaveReader
+    from wavestream import WaveWriter
+    from wavestream import PygameWavePlayer as WavePlayer
+    def usage():
+        print ('usage: %s [-v] [-t tempo] [-p pitch] [-n pitchmin] [-m pitchmax]'
+               ' [-c channel] [-b blocksize] [-o out.wav] wav' % argv[0])
+        return 100
+    try:
+        (opts, args) = getopt.getopt(argv[1:], 'vt:p:n:m:c:b:o:')
+    except getopt.GetoptError:
+        return usage()
+    verbose = 0
+    tempo = 1.0
+    pitch = 1.0
+    pitchmin = 70
+    pitchmax = 400
+    channel = -1
+    blocksize = 10000
+    outfp = None
+    for (k, v) in opts:
+        if k == '-v': verbose += 1
+        elif k == '-t': tempo = float(v)
+        elif k == '-p': pitch = float(v)
+        elif k == '-n': pitchmin = int(v)
+        elif k == '-m': pitchmax = int(v)
+        elif k == '-c': channel = int(v)
+        elif k == '-b': blocksize = int(v)
+        elif k == '-o': outfp = open(v, 'wb')
+    if len(args) != 1: return usage()
+    if tempo <= 0 or pitch <= 0: return usage()
+    src = WaveReader(args[0])
+    if outfp is not None:
+        dst = WaveWriter(outfp, nchannels=1, sampwidth=2,
+                         framerate=src.framerate)
+    else:
+        dst = WavePlayer(nchannels=1, sampwidth=2,
+                         framerate=src.framerate)
+    psola = PSOLA(src.framerate, tempo=tempo, pitch=pitch,
+                  pitchmin=pitchmin, pitchmax=pitchmax,
+                  bufsize=blocksize)
+    t0 = time.time()
+    while not src.eof():
+        (nframes,buf) = src.reads16(blocksize, channel)
+        for data in psola.feed(buf, nframes):
+            dst.writeraw(data)
+    for data in psola.flush():
+        dst.writeraw(data)
+    elapsed = time.time()-t0
+    if verbose:
+        duration = float(src.nframes)/src.framerate
+        print >>sys.stderr, ('%s: %.1fs -> %.1fs in %.2fs (%.1fx realtime), %d splices' %
+                             (args[0], duration, float(dst.tell())/src.framerate,
+                              elapsed, duration/max(elapsed, 1e-6), psola.nsplices))
+    src.close()
+    if outfp is not None:
+        dst.close()
+        outfp.close()
+    else:
+        # Play the whole output and wait until it ends.
+        dst.flush()
+        dst.wait()
+    return
+
+if __name__ == '__main__': sys.exit(main(sys.argv))
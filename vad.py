@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+#
+# Voice activity detector
+#
+# usage: python vad.py [-b base_name] [-B blocksize] [-r threshold_rms] [-p threshold_peak] [-w outer_window] [-W inner_window] [-c channel] wav ...
+#
+
+import sys
+import wavcorr
+
+
+##  ActivityDetector
+##
+##  Finds the blocks of 16-bit mono samples whose RMS and
+##  absolute peak are both above the thresholds.
+##
+class ActivityDetector(object):
+
+    def __init__(self, blocksize=160, threshold_rms=0.0, threshold_peak=0.025):
+        self.blocksize = blocksize
+        self.threshold_rms = threshold_rms
+        self.threshold_peak = threshold_peak
+        self.reset()
+        return
+
+    def reset(self, start=0):
+        # The samples less than a block are kept in _rest.
+        self._rest = ''
+        self._pos = start
+        self._start = None
+        return
+
+    def _blocks(self, buf, nblocks, blocksize):
+        for (rms,peak) in wavcorr.blockstats16(buf, 0, blocksize, nblocks):
+            active = (self.threshold_rms < rms and self.threshold_peak < peak)
+            if active and self._start is None:
+                self._start = self._pos
+            elif not active and self._start is not None:
+                yield (self._start, self._pos)
+                self._start = None
+            self._pos += blocksize
+        return
+
+    # feed: yields (start, end) of the active parts.
+    def feed(self, buf, nframes):
+        if self._rest:
+            buf = self._rest+buf[:]
+        nblocks = (len(buf)/2)/self.blocksize
+        for seg in self._blocks(buf, nblocks, self.blocksize):
+            yield seg
+        self._rest = buf[nblocks*self.blocksize*2:]
+        return
+
+    # flush: yields the last active part.
+    def flush(self):
+        n = len(self._rest)/2
+        if n:
+            for seg in self._blocks(self._rest, 1, n):
+                yield seg
+        self._rest = ''
+        if self._start is not None:
+            yield (self._start, self._pos)
+            self._start = None
+        return
+
+
+# merge_segments: extends each segment by before and after,
+# and merges the segments less than gap apart.
+def merge_segments(segments, before=0, after=0, gap=0):
+    (s0,e0) = (None,None)
+    for (s,e) in segments:
+        (s,e) = (s-before, e+after)
+        if e0 is not None and s-gap <= e0:
+            e0 = max(e0, e)
+            continue
+        if e0 is not None:
+            yield (s0,e0)
+        (s0,e0) = (s,e)
+    if e0 is not None:
+        yield (s0,e0)
+    return
+
+# detect_activity: returns the active parts of [start, end) of a file.
+def detect_activity(src, start, end, detector, channel=-1, bufsize=100000):
+    detector.reset(start)
+    src.seek(start)
+    length = end-start
+    while length:
+        (nframes,buf) = src.reads16(min(bufsize, length), channel)
+        if not nframes: break
+        length -= nframes
+        for seg in detector.feed(buf, nframes):
+            yield seg
+    for seg in detector.flush():
+        yield seg
+    return
+
+
+# main
+def main(argv):
+    import getopt
+    from wavestream import WaveReader
+    def usage():
+        print ('usage: %s [-b base_name] [-B blocksize]'
+               ' [-r threshold_rms] [-p threshold_peak]'
+               ' [-w outer_window] [-W inner_window] [-c channel]'
+               ' wav ...' % argv[0])
+        return 100
+    try:
+        (opts, args) = getopt.getopt(argv[1:], 'b:B:r:p:w:W:c:')
+    except getopt.GetoptError:
+        return usage()
+    base = 'out'
+    blocksize = 0.01
+    threshold_rms = 0.01
+    threshold_peak = 0.025
+    window0 = 0.1
+    window1 = 0.3
+    channel = -1
+    for (k,v) in opts:
+        if k == '-b': base = v
+        elif k == '-B': blocksize = float(v)
+        elif k == '-r': threshold_rms = float(v)
+        elif k == '-p': threshold_peak = float(v)
+        elif k == '-w': window0 = float(v)
+        elif k == '-W': window1 = float(v)
+        elif k == '-c': channel = int(v)
+    if not args: return usage()
+    i = 0
+    for path in args:
+        src = WaveReader(path)
+        detector = ActivityDetector(max(1, int(blocksize*src.framerate)),
+                                    threshold_rms=threshold_rms,
+                                    threshold_peak=threshold_peak)
+        w0 = int(window0*src.framerate)
+        w1 = int(window1*src.framerate)
+        segs = detect_activity(src, 0, src.nframes, detector, channel)
+        for (f0,f1) in merge_segments(segs, w0, w0, w1):
+            f0 = max(0, f0)
+            f1 = min(f1, src.nframes)
+            print '%s%04d %d %d' % (base, i, f0, f1)
+            i += 1
+        src.close()
+    return 0
+
+if __name__ == '__main__': sys.exit(main(sys.argv))
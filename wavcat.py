@@ -38,18 +38,20 @@ def main(argv):
         src = WaveReader(path)
         if verbose:
             print >>sys.stderr, \
-                ('%s: nchannels=%r, sampwidth=%r, framerate=%r, nframes=%r' %
-                 (path, src.nchannels, src.sampwidth, src.framerate, src.nframes))
+                ('%s: nchannels=%r, sampwidth=%r, format=%r, framerate=%r, nframes=%r' %
+                 (path, src.nchannels, src.sampwidth, src.format, src.framerate, src.nframes))
         if dst is None:
             if outfp is None:
                 dst = WavePlayer(nchannels=src.nchannels,
                                  sampwidth=src.sampwidth,
-                                 framerate=src.framerate)
+                                 framerate=src.framerate,
+                                 format=src.format)
             else:
                 dst = WaveWriter(outfp,
                                  nchannels=src.nchannels,
                                  sampwidth=src.sampwidth,
-                                 framerate=src.framerate)
+                                 framerate=src.framerate,
+                                 format=src.format)
         for (f0,f1) in ranges:
             if isinstance(f0, float):
                 f0 = int(f0*src.framerate)
@@ -7,11 +7,34 @@
 #include <stdlib.h>
 #include <string.h>
 #include <math.h>
+#include <pthread.h>
 
 //typedef short int16le;
 typedef int16_t int16le;
 static const double DIV16 = 1.0/32768.0;
 
+/* autocorrelation engines. */
+enum {
+    AUTOCORR_AUTO = 0,
+    AUTOCORR_DIRECT = 1,
+    AUTOCORR_FFT = 2,
+};
+/* sample formats (WAVE format tags). */
+enum {
+    FORMAT_PCM = 0x0001,
+    FORMAT_FLOAT = 0x0003,
+};
+/* output modes of psolas16into. */
+enum {
+    PSOLA_SET = 0,		/* int16, overwrite */
+    PSOLA_ADD = 1,		/* int16, add with saturation */
+    PSOLA_ADDF = 2,		/* float32, add (normalized to [-1.0, 1.0)) */
+};
+/* AUTOCORR_AUTO uses FFT if the range of lags is at least this. */
+static const int FFT_MINRANGE = 256;
+/* AUTOCORR_AUTO uses FFT for matching if the pattern is at least this long. */
+static const int FFT_MINMATCH = 64;
+
 inline int min(int x, int y) { return (x < y)? x : y; }
 inline int max(int x, int y) { return (x < y)? y : x; }
 inline double hann(int i, int n) { return (1.0-cos(2.0*M_PI*i/n))/2.0; }
@@ -63,6 +86,70 @@ double calcmags16(int length, const int16le* seq)
     return ((double)m1 - (double)m0)/2 * DIV16;
 }
 
+/* calcstats16: compute the RMS and the absolute peak of a vector. */
+double calcstats16(double* prms, int length, const int16le* seq)
+{
+    double s = 0;
+    int peak = 0;
+    int i;
+    for (i = 0; i < length; i++) {
+	int x = seq[i];
+	s += (double)x * x;
+	if (x < 0) x = -x;
+	if (peak < x) peak = x;
+    }
+    *prms = (0 < length)? sqrt(s/length) * DIV16 : 0;
+    return peak * DIV16;
+}
+
+/* overview record: the range and RMS of a block. */
+typedef struct _ovrecord
+{
+    int16le min, max;
+    float rms;
+} ovrecord;
+
+/* calcoverviews16: compute the overview record of a vector. */
+void calcoverviews16(ovrecord* rec, int length, const int16le* seq)
+{
+    int16le m0 = SHRT_MAX;
+    int16le m1 = SHRT_MIN;
+    double s = 0;
+    int i;
+    for (i = 0; i < length; i++) {
+	int16le x = seq[i];
+	if (m1 < x) m1 = x;
+	if (x < m0) m0 = x;
+	s += (double)x * x;
+    }
+    if (length == 0) {
+	m0 = m1 = 0;
+    }
+    rec->min = m0;
+    rec->max = m1;
+    rec->rms = (float)((0 < length)? sqrt(s/length) * DIV16 : 0);
+}
+
+/* mergeoverviews: merge n overview records into one. */
+void mergeoverviews(ovrecord* rec, int n, const ovrecord* recs)
+{
+    int16le m0 = SHRT_MAX;
+    int16le m1 = SHRT_MIN;
+    double s = 0;
+    int i;
+    for (i = 0; i < n; i++) {
+	if (m1 < recs[i].max) m1 = recs[i].max;
+	if (recs[i].min < m0) m0 = recs[i].min;
+	s += (double)recs[i].rms * recs[i].rms;
+    }
+    if (n == 0) {
+	m0 = m1 = 0;
+    }
+    rec->min = m0;
+    rec->max = m1;
+    rec->rms = (float)((0 < n)? sqrt(s/n) : 0);
+}
+
 /* calcmatchs16: compute the similarity between two vectors. */
 double calcmatchs16(int patlen, const int16le* pat,
 		    int datalen, const int16le* data,
@@ -141,6 +228,447 @@ int autocorrs16(double* sim, int window0, int window1, int length, const int16le
     return 0;
 }
 
+/* fft: in-place radix-2 complex FFT (n must be a power of two). */
+void fft(int n, double* re, double* im, int inverse)
+{
+    int i, j, k, m;
+    for (i = 1, j = 0; i < n; i++) {
+	int bit = n >> 1;
+	for (; j & bit; bit >>= 1) {
+	    j ^= bit;
+	}
+	j ^= bit;
+	if (i < j) {
+	    double t;
+	    t = re[i]; re[i] = re[j]; re[j] = t;
+	    t = im[i]; im[i] = im[j]; im[j] = t;
+	}
+    }
+    for (m = 2; m <= n; m <<= 1) {
+	double a = (inverse? 2.0 : -2.0)*M_PI/m;
+	double wr = cos(a), wi = sin(a);
+	for (i = 0; i < n; i += m) {
+	    double cr = 1, ci = 0;
+	    for (k = 0; k < m/2; k++) {
+		int p = i+k, q = i+k+m/2;
+		double xr = re[q]*cr - im[q]*ci;
+		double xi = re[q]*ci + im[q]*cr;
+		re[q] = re[p]-xr; im[q] = im[p]-xi;
+		re[p] += xr; im[p] += xi;
+		double t = cr*wr - ci*wi;
+		ci = cr*wi + ci*wr;
+		cr = t;
+	    }
+	}
+    }
+}
+
+/* autocorrs16fft: same as autocorrs16, but computes all the lags
+   at once with FFT. The correlation over window1 samples is
+   trimmed to the largest multiple of each lag by subtracting
+   the remainder (shorter than the lag) directly.
+   Returns -1 if memory cannot be allocated. */
+int autocorrs16fft(double* sim, int window0, int window1, int length, const int16le* seq)
+{
+    /* assert(window0 <= window1); */
+
+    int w;
+    for (w = window0; w <= window1; w++) {
+	sim[w-window0] = 0;
+    }
+
+    int n = window1;
+    int m = min(length, window1*2);
+    int nfft = 1;
+    while (nfft < window1*2) nfft <<= 1;
+
+    double* re = (double*) malloc(sizeof(double)*(nfft*2+(m+1)*2));
+    if (re == NULL) return -1;
+    double* im = re+nfft;
+    double* cs = im+nfft;	/* cumulative sum */
+    double* cq = cs+m+1;	/* cumulative sum of squares */
+
+    /* z = a + i*b, where a = seq[0:n] and b = seq[0:m]. */
+    int i;
+    cs[0] = cq[0] = 0;
+    for (i = 0; i < nfft; i++) {
+	double x = (i < m)? seq[i]*DIV16 : 0;
+	re[i] = (i < n)? x : 0;
+	im[i] = x;
+	if (i < m) {
+	    cs[i+1] = cs[i] + x;
+	    cq[i+1] = cq[i] + x*x;
+	}
+    }
+    fft(nfft, re, im, 0);
+    /* split A and B, then compute conj(A)*B. */
+    for (i = 0; i <= nfft/2; i++) {
+	int j = (nfft-i) & (nfft-1);
+	double ar = (re[i]+re[j])/2, ai = (im[i]-im[j])/2;
+	double br = (im[i]+im[j])/2, bi = (re[j]-re[i])/2;
+	double cr = ar*br + ai*bi;
+	double ci = ar*bi - ai*br;
+	re[i] = cr; im[i] = ci;
+	re[j] = cr; im[j] = -ci;
+    }
+    fft(nfft, re, im, 1);
+
+    /* Enhanced Auto Correlation (see autocorrs16). */
+    for (w = window0; w <= window1; w++) {
+	int w1 = window1 - (window1%w);
+	if (w1+w <= m) {
+	    /* the remainder is summed exactly in integers. */
+	    long long r = 0;
+	    int j;
+	    for (j = w1; j < min(n, m-w); j++) {
+		r += seq[j]*seq[j+w];
+	    }
+	    double dot = re[w]/nfft - r*DIV16*DIV16;
+	    double s1 = cs[w1];
+	    double t1 = cq[w1];
+	    double s2 = cs[w+w1]-cs[w];
+	    double t2 = cq[w+w1]-cq[w];
+	    double ns = (w1*dot-s1*s2);
+	    double nv1 = (w1*t1-s1*s1);
+	    double nv2 = (w1*t2-s2*s2);
+	    double nv = fmax(nv1, nv2);
+	    double s = (nv == 0)? 0 : (ns / nv);
+	    s += sim[w-window0];
+	    s = (0 < s)? s : 0;
+	    sim[w-window0] = s;
+	    /* remove overlapping freq. */
+	    int i2 = w*2-window0;
+	    if (i2+1 <= window1-window0) {
+		s *= 0.5;
+		sim[i2] -= s;
+		sim[i2+1] -= s;
+	    }
+	}
+    }
+
+    free(re);
+    return 0;
+}
+
+/* matchs16: find the offset of the pattern that has the maximum similarity. */
+int matchs16(double* psim, int patlen, const int16le* pat,
+	     int window, const int16le* data)
+{
+    int dmax = -1;
+    double smax = -1;
+    int d;
+    for (d = 0; d < window; d++) { 
+	double s = calcmatchs16(patlen, pat, window, data, d);
+	if (smax < s) {
+	    dmax = d;
+	    smax = s;
+	}
+    }
+    *psim = smax;
+    return dmax;
+}
+
+/* foldmatchs16: fold the data onto the pattern length.
+   x[k] is the sum of the samples that are compared with pat[k],
+   and c[k] is their number (if c is not NULL). */
+static void foldmatchs16(double* x, double* c, double* ps2, double* pt2,
+			 int patlen, int window, const int16le* data)
+{
+    int i;
+    double s2 = 0, t2 = 0;
+    if (patlen < window) {
+	/* pattern gets expanded */
+	for (i = 0; i < window; i++) {
+	    double v = data[i]*DIV16;
+	    int k = i*patlen/window;
+	    x[k] += v;
+	    if (c != NULL) c[k] += 1;
+	    s2 += v;
+	    t2 += v*v;
+	}
+    } else {
+	/* data gets expanded */
+	for (i = 0; i < patlen; i++) {
+	    double v = data[i*window/patlen]*DIV16;
+	    x[i] = v;
+	    if (c != NULL) c[i] = 1;
+	    s2 += v;
+	    t2 += v*v;
+	}
+    }
+    *ps2 = s2;
+    *pt2 = t2;
+}
+
+/* pickmatchs16: find the offset that has the maximum similarity
+   from the (unnormalized) correlations computed by FFT. */
+static void pickmatchs16(int* pdmax, double* psim, int n, int m, int nfft,
+			 const double* dots, const double* sums, const double* sqrs,
+			 double s2, double t2)
+{
+    int dmax = -1;
+    double smax = -1;
+    double nv2 = (n*t2-s2*s2);
+    int d;
+    for (d = 0; d < m; d++) {
+	double dot = dots[d]/nfft;
+	double s1 = sums[d]/nfft;
+	double t1 = sqrs[d]/nfft;
+	double ns = (n*dot-s1*s2);
+	double nv1 = (n*t1-s1*s1);
+	/* ignore the rounding errors of a flat pattern. */
+	if (nv1 < n*t1*1e-9) nv1 = 0;
+	double nv = sqrt(nv1*nv2);
+	double s = (nv == 0)? 0 : (ns / nv);
+	/* prefer the first offset when there are ties. */
+	if (smax+1e-9 < s) {
+	    dmax = d;
+	    smax = s;
+	}
+    }
+    *pdmax = dmax;
+    *psim = smax;
+}
+
+/* matchs16fft: same as matchs16, but computes all the offsets
+   at once with FFT. The data is folded onto the pattern length
+   (summing the samples that are compared with the same pattern
+   sample), so the result is the same as calcmatchs16.
+   Returns -1 if memory cannot be allocated. */
+int matchs16fft(int* pdmax, double* psim, int patlen, const int16le* pat,
+		int window, const int16le* data)
+{
+    *pdmax = -1;
+    *psim = -1;
+    if (patlen <= 0 || window <= 0) return 0;
+
+    int p = patlen;
+    int nfft = 1;
+    while (nfft < p*2) nfft <<= 1;
+
+    double* re = (double*) malloc(sizeof(double)*nfft*4);
+    if (re == NULL) return -1;
+    double* im = re+nfft;
+    double* br = im+nfft;
+    double* bi = br+nfft;
+
+    /* a = pat + i*pat^2 (repeated twice), b = data + i*count. */
+    int i;
+    double s2, t2;
+    for (i = 0; i < nfft; i++) {
+	double x = (i < p*2)? pat[i % p]*DIV16 : 0;
+	re[i] = x;
+	im[i] = x*x;
+	br[i] = bi[i] = 0;
+    }
+    foldmatchs16(br, bi, &s2, &t2, patlen, window, data);
+    fft(nfft, re, im, 0);
+    fft(nfft, br, bi, 0);
+    /* split B into data and count, then compute conj(data)*A and conj(count)*A. */
+    for (i = 0; i <= nfft/2; i++) {
+	int j = (nfft-i) & (nfft-1);
+	double dr = (br[i]+br[j])/2, di = (bi[i]-bi[j])/2;
+	double cr = (bi[i]+bi[j])/2, ci = (br[j]-br[i])/2;
+	double ar = re[i], ai = im[i];
+	double aj = re[j], bj = im[j];
+	re[i] = dr*ar + di*ai; im[i] = dr*ai - di*ar;
+	br[i] = cr*ar + ci*ai; bi[i] = cr*ai - ci*ar;
+	re[j] = dr*aj - di*bj; im[j] = dr*bj + di*aj;
+	br[j] = cr*aj - ci*bj; bi[j] = cr*bj + ci*aj;
+    }
+    fft(nfft, re, im, 1);
+    fft(nfft, br, bi, 1);
+
+    /* dot = re, s1 = br, t1 = bi. */
+    pickmatchs16(pdmax, psim, max(patlen, window), min(window, p), nfft,
+		 re, br, bi, s2, t2);
+
+    free(re);
+    return 0;
+}
+
+/* matchprof16: a pattern prepared for matching with a given window.
+   It is followed by the spectrum of pat + i*pat^2 (nfft*2 doubles),
+   the pattern sums and sums of squares for each offset (nsims*2 doubles)
+   and the magnitude spectrum of pat (nfft/2+1 doubles). */
+typedef struct _matchprof16
+{
+    int patlen;
+    int window;
+    int nfft;
+    int nsims;
+    double nv1min;		/* minimum nonzero variance (times n^2) */
+} matchprof16;
+
+/* matchprofsize16: the number of bytes of a matchprof16. */
+size_t matchprofsize16(int patlen, int window)
+{
+    int nfft = 1;
+    while (nfft < patlen*2) nfft <<= 1;
+    return sizeof(matchprof16)+sizeof(double)*(nfft*2+min(patlen, window)*2+nfft/2+1);
+}
+
+/* makematchprof16: prepare a pattern for matchprofs16.
+   out must hold matchprofsize16(patlen, window) bytes.
+   It does not have to be aligned.
+   Returns -1 if memory cannot be allocated. */
+int makematchprof16(void* out, int patlen, const int16le* pat, int window)
+{
+    /* assert(0 < patlen && 0 < window); */
+    matchprof16 prof;
+    prof.patlen = patlen;
+    prof.window = window;
+    prof.nfft = 1;
+    while (prof.nfft < patlen*2) prof.nfft <<= 1;
+    prof.nsims = min(patlen, window);
+    prof.nv1min = 0;
+
+    int nfft = prof.nfft;
+    double* re = (double*) malloc(sizeof(double)*nfft*4);
+    if (re == NULL) return -1;
+    double* im = re+nfft;
+    double* cr = im+nfft;
+    double* ci = cr+nfft;
+
+    /* a = pat + i*pat^2 (repeated twice), c = count (see foldmatchs16). */
+    int i;
+    for (i = 0; i < nfft; i++) {
+	double x = (i < patlen*2)? pat[i % patlen]*DIV16 : 0;
+	re[i] = x;
+	im[i] = x*x;
+	cr[i] = ci[i] = 0;
+    }
+    if (patlen < window) {
+	for (i = 0; i < window; i++) {
+	    cr[i*patlen/window] += 1;
+	}
+    } else {
+	for (i = 0; i < patlen; i++) {
+	    cr[i] = 1;
+	}
+    }
+    fft(nfft, re, im, 0);
+    fft(nfft, cr, ci, 0);
+
+    char* p = (char*)out + sizeof(prof);
+    memcpy(p, re, sizeof(double)*nfft);
+    p += sizeof(double)*nfft;
+    memcpy(p, im, sizeof(double)*nfft);
+    p += sizeof(double)*nfft;
+    char* psims = p;
+    p += sizeof(double)*prof.nsims*2;
+
+    /* |pat|: the real part of A. */
+    for (i = 0; i <= nfft/2; i++) {
+	int j = (nfft-i) & (nfft-1);
+	double pr = (re[i]+re[j])/2, pi = (im[i]-im[j])/2;
+	double mag = sqrt(pr*pr + pi*pi);
+	memcpy(p, &mag, sizeof(mag));
+	p += sizeof(mag);
+    }
+
+    /* compute conj(count)*A. */
+    for (i = 0; i < nfft; i++) {
+	double ar = re[i], ai = im[i];
+	re[i] = cr[i]*ar + ci[i]*ai;
+	im[i] = cr[i]*ai - ci[i]*ar;
+    }
+    fft(nfft, re, im, 1);
+    memcpy(psims, re, sizeof(double)*prof.nsims);
+    memcpy(psims+sizeof(double)*prof.nsims, im, sizeof(double)*prof.nsims);
+
+    /* find the minimum variance (see pickmatchs16). */
+    int n = max(patlen, window);
+    int d;
+    for (d = 0; d < prof.nsims; d++) {
+	double s1 = re[d]/nfft;
+	double t1 = im[d]/nfft;
+	double nv1 = (n*t1-s1*s1);
+	if (nv1 < n*t1*1e-9) continue;
+	if (prof.nv1min == 0 || nv1 < prof.nv1min) {
+	    prof.nv1min = nv1;
+	}
+    }
+    memcpy(out, &prof, sizeof(prof));
+
+    free(re);
+    return 0;
+}
+
+/* matchprofs16: same as matchs16fft, but uses a prepared pattern.
+   If the upper bound of the similarity is less than minsim,
+   the offsets are not evaluated and *pdmax is set to -1 and
+   *psim to the bound. Returns -1 if memory cannot be allocated. */
+int matchprofs16(int* pdmax, double* psim, const void* prof0,
+		 const int16le* data, double minsim)
+{
+    matchprof16 prof;
+    memcpy(&prof, prof0, sizeof(prof));
+    int nfft = prof.nfft;
+    int n = max(prof.patlen, prof.window);
+
+    double* re = (double*) malloc(sizeof(double)*(nfft*5+prof.nsims*2+nfft/2+1));
+    if (re == NULL) return -1;
+    double* im = re+nfft;
+    double* cnt = im+nfft;
+    double* ar = cnt+nfft;
+    double* ai = ar+nfft;
+    double* sums = ai+nfft;
+    double* sqrs = sums+prof.nsims;
+    double* mags = sqrs+prof.nsims;
+    const char* p = (const char*)prof0 + sizeof(prof);
+    memcpy(ar, p, sizeof(double)*(nfft*2+prof.nsims*2+nfft/2+1));
+
+    /* z = data + i*(data - count*mean). */
+    int i;
+    double s2, t2;
+    for (i = 0; i < nfft; i++) {
+	re[i] = im[i] = cnt[i] = 0;
+    }
+    foldmatchs16(re, cnt, &s2, &t2, prof.patlen, prof.window, data);
+    for (i = 0; i < nfft; i++) {
+	im[i] = re[i] - cnt[i]*s2/n;
+    }
+    fft(nfft, re, im, 0);
+
+    /* upper bound: the mean-removed correlation is at most
+       sum(|data_f|*|pat_f|)/nfft for any offset. */
+    double nv2 = (n*t2-s2*s2);
+    double bound = 0;
+    for (i = 0; i <= nfft/2; i++) {
+	int j = (nfft-i) & (nfft-1);
+	double er = (im[i]+im[j])/2, ei = (re[j]-re[i])/2;
+	double x = sqrt(er*er + ei*ei)*mags[i];
+	bound += (i == j)? x : x*2;
+    }
+    bound /= nfft;
+    double nv = sqrt(prof.nv1min*nv2);
+    double simub = (nv == 0)? 0 : (n*bound / nv);
+    if (simub+1e-9 < minsim) {
+	*pdmax = -1;
+	*psim = simub;
+	free(re);
+	return 0;
+    }
+
+    /* split z and compute conj(data)*A. */
+    for (i = 0; i <= nfft/2; i++) {
+	int j = (nfft-i) & (nfft-1);
+	double dr = (re[i]+re[j])/2, di = (im[i]-im[j])/2;
+	double xr = ar[i], xi = ai[i];
+	double yr = ar[j], yi = ai[j];
+	re[i] = dr*xr + di*xi; im[i] = dr*xi - di*xr;
+	re[j] = dr*yr - di*yi; im[j] = dr*yi + di*yr;
+    }
+    fft(nfft, re, im, 1);
+
+    pickmatchs16(pdmax, psim, n, prof.nsims, nfft,
+		 re, sums, sqrs, s2, t2);
+
+    free(re);
+    return 0;
+}
+
 /* autosplices16: find the window that has the maximum similarity. */
 int autosplices16(double* psim, int window0, int window1, 
 		  int length1, const int16le* seq1, 
@@ -170,10 +698,10 @@ int autosplices16(double* psim, int window0, int window1,
     return wmax;
 }
 
-/* psolas16: overlap-add two vectors. */
-void psolas16(int outlen, int16le* out, 
-	      int length1, const int16le* seq1, 
-	      int length2, const int16le* seq2)
+/* psolaadds16: overlap-add two vectors into out (int16 or float32). */
+void psolaadds16(int mode, int outlen, void* out, 
+		 int length1, const int16le* seq1, 
+		 int length2, const int16le* seq2)
 {
     int i;
 
@@ -188,124 +716,566 @@ void psolas16(int outlen, int16le* out,
 	    /* second half (increasing) */
 	    v += seq2[i*length2/outlen] * hann(i, outlen*2);
 	}
-	out[i] = (int16le)v;
+	switch (mode) {
+	case PSOLA_ADD:
+	    v += ((int16le*)out)[i];
+	    ((int16le*)out)[i] = (int16le)((v < SHRT_MIN)? SHRT_MIN : (SHRT_MAX < v)? SHRT_MAX : v);
+	    break;
+	case PSOLA_ADDF:
+	    ((float*)out)[i] += (float)(v * DIV16);
+	    break;
+	default:
+	    ((int16le*)out)[i] = (int16le)v;
+	    break;
+	}
     }
 }
 
-
-/*  Python functions
- */
-
-/* pycalcsims16(window, data1, offset1, data2, offset2); */
-static PyObject* pycalcsims16(PyObject* self, PyObject* args)
+/* psolas16: overlap-add two vectors. */
+void psolas16(int outlen, int16le* out, 
+	      int length1, const int16le* seq1, 
+	      int length2, const int16le* seq2)
 {
-    int window;
-    PyObject* data1;
-    PyObject* data2;
-    int offset1;
-    int offset2;
+    psolaadds16(PSOLA_SET, outlen, out, length1, seq1, length2, seq2);
+}
 
-    if (!PyArg_ParseTuple(args, "iOiOi",
-			  &window, &data1, &offset1, &data2, &offset2)) {
-	return NULL;
+/* checkformat: returns 1 if the sample format is supported. */
+int checkformat(int sampwidth, int format)
+{
+    switch (format) {
+    case FORMAT_PCM:
+	return (1 <= sampwidth && sampwidth <= 4);
+    case FORMAT_FLOAT:
+	return (sampwidth == 4);
+    default:
+	return 0;
     }
+}
 
-    if (!PyString_CheckExact(data1) ||
-	!PyString_CheckExact(data2)) {
-	PyErr_SetString(PyExc_TypeError, "Must be string");
-	return NULL;
-    }
+/* gets24, gets32: read a little-endian signed integer. */
+inline int32_t gets24(const unsigned char* p)
+{
+    return (int32_t)((p[0] << 8) | (p[1] << 16) | ((uint32_t)p[2] << 24)) >> 8;
+}
+inline int32_t gets32(const unsigned char* p)
+{
+    return (int32_t)(p[0] | (p[1] << 8) | (p[2] << 16) | ((uint32_t)p[3] << 24));
+}
 
-    int length1 = PyString_Size(data1) / sizeof(int16le);
-    int length2 = PyString_Size(data2) / sizeof(int16le);
-    if (window < 0 ||
-	offset1 < 0 || length1 < offset1+window ||
-	offset2 < 0 || length2 < offset2+window) {
-	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
-	return NULL;
+/* getsample: read a sample scaled to the 32-bit range. */
+inline int32_t getsample(const unsigned char* p, int sampwidth, int format)
+{
+    if (format == FORMAT_FLOAT) {
+	float x;
+	memcpy(&x, p, sizeof(float));
+	double v = x * 2147483648.0;
+	return (v < INT32_MIN)? INT32_MIN : (INT32_MAX < v)? INT32_MAX : (int32_t)v;
+    }
+    switch (sampwidth) {
+    case 1:
+	return (int32_t)((uint32_t)(p[0]-128) << 24);
+    case 2:
+	return (int32_t)((uint32_t)(int16_t)(p[0] | (p[1] << 8)) << 16);
+    case 3:
+	return (int32_t)((uint32_t)gets24(p) << 8);
+    default:
+	return gets32(p);
     }
-
-    int16le* seq1 = (int16le*)PyString_AsString(data1);
-    int16le* seq2 = (int16le*)PyString_AsString(data2);
-    double sim = calcsims16(window, &seq1[offset1], &seq2[offset2]);
-
-    return PyFloat_FromDouble(sim);
 }
 
-
-/* pycalcmags16(data, offset, window); */
-static PyObject* pycalcmags16(PyObject* self, PyObject* args)
+/* pcmtos16: convert n frames of interleaved samples to 16-bit mono.
+   channel < 0 mixes down all the channels. */
+void pcmtos16(Py_ssize_t n, int16le* out, int sampwidth, int format,
+	      int nchannels, int channel, const void* data)
 {
-    PyObject* data;
-    int offset;
-    int window;
-
-    if (!PyArg_ParseTuple(args, "Oii", &data, &offset, &window)) {
-	return NULL;
+    const unsigned char* seq = (const unsigned char*)data;
+    int framesize = sampwidth * nchannels;
+    Py_ssize_t i;
+    if (sampwidth == 2 && format == FORMAT_PCM && 0 <= channel) {
+	/* 16-bit: a strided copy. */
+	seq += 2*channel;
+	for (i = 0; i < n; i++) {
+	    out[i] = (int16le)(seq[0] | (seq[1] << 8));
+	    seq += framesize;
+	}
+    } else if (0 <= channel) {
+	seq += sampwidth*channel;
+	for (i = 0; i < n; i++) {
+	    out[i] = (int16le)(getsample(seq, sampwidth, format) >> 16);
+	    seq += framesize;
+	}
+    } else {
+	for (i = 0; i < n; i++) {
+	    int64_t x = 0;
+	    int c;
+	    for (c = 0; c < nchannels; c++) {
+		x += getsample(seq+sampwidth*c, sampwidth, format);
+	    }
+	    out[i] = (int16le)((x / nchannels) >> 16);
+	    seq += framesize;
+	}
     }
+}
 
-    if (!PyString_CheckExact(data)) {
-	PyErr_SetString(PyExc_TypeError, "Must be string");
-	return NULL;
+/* pcmtofloat32: convert PCM samples to floats in [-1.0, 1.0). */
+void pcmtofloat32(Py_ssize_t n, float* out, int sampwidth, int format, const void* data)
+{
+    Py_ssize_t i;
+    if (format == FORMAT_FLOAT) {
+	memcpy(out, data, sizeof(float)*n);
+    } else if (sampwidth == 1) {
+	const unsigned char* seq = (const unsigned char*)data;
+	for (i = 0; i < n; i++) {
+	    out[i] = (seq[i]-128) * (1.0f/128.0f);
+	}
+    } else if (sampwidth == 2) {
+	const int16le* seq = (const int16le*)data;
+	for (i = 0; i < n; i++) {
+	    out[i] = seq[i] * (float)DIV16;
+	}
+    } else if (sampwidth == 3) {
+	const unsigned char* seq = (const unsigned char*)data;
+	for (i = 0; i < n; i++) {
+	    out[i] = (float)(gets24(seq+3*i) * (1.0/8388608.0));
+	}
+    } else {
+	const unsigned char* seq = (const unsigned char*)data;
+	for (i = 0; i < n; i++) {
+	    out[i] = (float)(gets32(seq+4*i) * (1.0/2147483648.0));
+	}
     }
+}
 
-    int length = PyString_Size(data) / sizeof(int16le);
-    if (window < 0 ||
-	offset < 0 || length < offset+window) {
-	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
-	return NULL;
+/* float32topcm: convert floats to PCM samples with clipping. */
+void float32topcm(Py_ssize_t n, void* out, int sampwidth, int format, const float* seq)
+{
+    Py_ssize_t i;
+    if (format == FORMAT_FLOAT) {
+	memcpy(out, seq, sizeof(float)*n);
+    } else if (sampwidth == 1) {
+	unsigned char* dst = (unsigned char*)out;
+	for (i = 0; i < n; i++) {
+	    double x = seq[i]*127.0+128.0;
+	    dst[i] = (unsigned char)((x < 0)? 0 : (255 < x)? 255 : x);
+	}
+    } else if (sampwidth == 2) {
+	int16le* dst = (int16le*)out;
+	for (i = 0; i < n; i++) {
+	    double x = seq[i]*32767.0;
+	    dst[i] = (int16le)((x < SHRT_MIN)? SHRT_MIN : (SHRT_MAX < x)? SHRT_MAX : x);
+	}
+    } else {
+	unsigned char* dst = (unsigned char*)out;
+	double scale = (sampwidth == 3)? 8388607.0 : 2147483647.0;
+	for (i = 0; i < n; i++) {
+	    double x = seq[i]*scale;
+	    int32_t v = (x < -scale-1)? (int32_t)(-scale-1) : (scale < x)? (int32_t)scale : (int32_t)x;
+	    int b;
+	    for (b = 0; b < sampwidth; b++) {
+		*dst++ = (unsigned char)((uint32_t)v >> (8*b));
+	    }
+	}
     }
+}
 
-    int16le* seq = (int16le*)PyString_AsString(data);
-    double mag = calcmags16(window, &seq[offset]);
 
-    return PyFloat_FromDouble(mag);
-}
+/*  Python functions
+ */
 
+/* seqbuf: int16 samples of any object that supports the buffer protocol. */
+typedef struct _seqbuf
+{
+    Py_buffer view;
+    int hasview;
+    int locked;
+    void* copy;
+    const int16le* seq;
+    Py_ssize_t length;
+    Py_ssize_t nbytes;
+} seqbuf;
 
-/* pyautocorrs16(window0, window1, data, offset); */
-typedef struct _corritem
+/* islocked: str and bytearray cannot be freed or resized
+   while a view is held. Other exporters (buffer objects over
+   an mmap, etc.) can be unmapped when the GIL is released. */
+static int islocked(Py_buffer* view)
 {
-    int dw;
-    double sim;
-} corritem;
+    return (view->obj != NULL &&
+	    (PyString_Check(view->obj) || PyByteArray_Check(view->obj)));
+}
 
-static int cmp_corritem(const void* a, const void* b)
+static void releaseseqbuf(seqbuf* buf)
 {
-    double p = ((const corritem*)a)->sim;
-    double q = ((const corritem*)b)->sim;
-    if (p == q) {
-	return 0;
-    } else if (p < q) {
-	return +1;
-    } else {
-	return -1;
+    if (buf->hasview) {
+	PyBuffer_Release(&buf->view);
+	buf->hasview = 0;
     }
+    PyMem_Free(buf->copy);
+    buf->copy = NULL;
 }
 
-static PyObject* pyautocorrs16(PyObject* self, PyObject* args)
+static int getseqbuf(seqbuf* buf, PyObject* obj)
 {
-    int window0, window1, maxitems;
+    const void* p;
+    Py_ssize_t len;
+    buf->hasview = 0;
+    buf->locked = 0;
+    buf->copy = NULL;
+    if (PyObject_CheckBuffer(obj)) {
+	if (PyObject_GetBuffer(obj, &buf->view, PyBUF_SIMPLE) < 0) {
+	    return -1;
+	}
+	buf->hasview = 1;
+	buf->locked = islocked(&buf->view);
+	p = buf->view.buf;
+	len = buf->view.len;
+    } else {
+	/* old-style buffers (array, mmap). */
+	if (PyObject_AsReadBuffer(obj, &p, &len) < 0) {
+	    PyErr_Clear();
+	    PyErr_SetString(PyExc_TypeError, "Must be buffer");
+	    return -1;
+	}
+    }
+    if (!buf->locked) {
+	/* copy the samples while the GIL is held. */
+	buf->copy = PyMem_Malloc(len? len : 1);
+	if (buf->copy == NULL) {
+	    releaseseqbuf(buf);
+	    PyErr_NoMemory();
+	    return -1;
+	}
+	memcpy(buf->copy, p, len);
+	p = buf->copy;
+    }
+    buf->seq = (const int16le*)p;
+    buf->nbytes = len;
+    buf->length = len / sizeof(int16le);
+    return 0;
+}
+
+/* getoutbuf: writable buffer (bytearray, array, mmap, etc.)
+   Unless buf->locked is set, the GIL must be kept while
+   the buffer is written. */
+static int getoutbuf(seqbuf* buf, PyObject* obj, void** pout)
+{
+    buf->hasview = 0;
+    buf->locked = 0;
+    buf->copy = NULL;
+    if (PyObject_CheckBuffer(obj)) {
+	if (PyObject_GetBuffer(obj, &buf->view, PyBUF_WRITABLE) < 0) {
+	    PyErr_Clear();
+	    PyErr_SetString(PyExc_TypeError, "Must be writable buffer");
+	    return -1;
+	}
+	buf->hasview = 1;
+	buf->locked = islocked(&buf->view);
+	*pout = buf->view.buf;
+	buf->nbytes = buf->view.len;
+    } else {
+	/* old-style buffers (array, mmap). */
+	void* p;
+	Py_ssize_t len;
+	if (PyObject_AsWriteBuffer(obj, &p, &len) < 0) {
+	    PyErr_Clear();
+	    PyErr_SetString(PyExc_TypeError, "Must be writable buffer");
+	    return -1;
+	}
+	*pout = p;
+	buf->nbytes = len;
+    }
+    buf->seq = NULL;
+    buf->length = 0;
+    return 0;
+}
+
+/* clamplen: the kernels take the number of samples as int. */
+static int clamplen(Py_ssize_t n)
+{
+    return (n < INT_MAX)? (int)n : INT_MAX;
+}
+
+
+/* pycalcsims16(window, data1, offset1, data2, offset2); */
+static PyObject* pycalcsims16(PyObject* self, PyObject* args)
+{
+    int window;
+    PyObject* data1;
+    PyObject* data2;
+    Py_ssize_t offset1;
+    Py_ssize_t offset2;
+
+    if (!PyArg_ParseTuple(args, "iOnOn",
+			  &window, &data1, &offset1, &data2, &offset2)) {
+	return NULL;
+    }
+
+    seqbuf buf1, buf2;
+    if (getseqbuf(&buf1, data1) < 0) return NULL;
+    if (getseqbuf(&buf2, data2) < 0) {
+	releaseseqbuf(&buf1);
+	return NULL;
+    }
+
+    PyObject* result = NULL;
+    if (window < 0 ||
+	offset1 < 0 || buf1.length < offset1+window ||
+	offset2 < 0 || buf2.length < offset2+window) {
+	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
+    } else {
+	double sim;
+	Py_BEGIN_ALLOW_THREADS
+	sim = calcsims16(window, &buf1.seq[offset1], &buf2.seq[offset2]);
+	Py_END_ALLOW_THREADS
+	result = PyFloat_FromDouble(sim);
+    }
+
+    releaseseqbuf(&buf2);
+    releaseseqbuf(&buf1);
+    return result;
+}
+
+
+/* pycalcmags16(data, offset, window); */
+static PyObject* pycalcmags16(PyObject* self, PyObject* args)
+{
+    PyObject* data;
+    Py_ssize_t offset;
+    int window;
+
+    if (!PyArg_ParseTuple(args, "Oni", &data, &offset, &window)) {
+	return NULL;
+    }
+
+    seqbuf buf;
+    if (getseqbuf(&buf, data) < 0) return NULL;
+
+    PyObject* result = NULL;
+    if (window < 0 ||
+	offset < 0 || buf.length < offset+window) {
+	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
+    } else {
+	double mag;
+	Py_BEGIN_ALLOW_THREADS
+	mag = calcmags16(window, &buf.seq[offset]);
+	Py_END_ALLOW_THREADS
+	result = PyFloat_FromDouble(mag);
+    }
+
+    releaseseqbuf(&buf);
+    return result;
+}
+
+
+/* pyblockstats16(data, offset, blocksize, nblocks);
+   returns [(rms, peak), ...] of the consecutive blocks. */
+static PyObject* pyblockstats16(PyObject* self, PyObject* args)
+{
+    PyObject* data;
+    Py_ssize_t offset;
+    int blocksize;
+    int nblocks;
+
+    if (!PyArg_ParseTuple(args, "Onii", &data, &offset, &blocksize, &nblocks)) {
+	return NULL;
+    }
+
+    seqbuf buf;
+    if (getseqbuf(&buf, data) < 0) return NULL;
+
+    PyObject* list = NULL;
+    double* stats = NULL;
+    if (blocksize <= 0 || nblocks < 0 || offset < 0 ||
+	(buf.length-offset)/blocksize < nblocks) {
+	PyErr_SetString(PyExc_ValueError, "Invalid offset/blocksize");
+    } else if ((stats = (double*) PyMem_Malloc(sizeof(double)*2*(nblocks+1))) == NULL) {
+	PyErr_NoMemory();
+    } else {
+	int i;
+	Py_BEGIN_ALLOW_THREADS
+	for (i = 0; i < nblocks; i++) {
+	    stats[i*2+1] = calcstats16(&stats[i*2], blocksize,
+				       &buf.seq[offset+(Py_ssize_t)i*blocksize]);
+	}
+	Py_END_ALLOW_THREADS
+	list = PyList_New(nblocks);
+	for (i = 0; i < nblocks; i++) {
+	    PyObject* v1 = PyFloat_FromDouble(stats[i*2]);
+	    PyObject* v2 = PyFloat_FromDouble(stats[i*2+1]);
+	    PyObject* tuple = PyTuple_Pack(2, v1, v2);
+	    PyList_SetItem(list, i, tuple);
+	    Py_DECREF(v1);
+	    Py_DECREF(v2);
+	}
+	PyMem_Free(stats);
+    }
+
+    releaseseqbuf(&buf);
+    return list;
+}
+
+
+/* pyoverviews16(data, offset, blocksize, nblocks);
+   returns the overview records (min(h), max(h), rms(f)) of the blocks. */
+static PyObject* pyoverviews16(PyObject* self, PyObject* args)
+{
+    PyObject* data;
+    Py_ssize_t offset;
+    int blocksize;
+    int nblocks;
+
+    if (!PyArg_ParseTuple(args, "Onii", &data, &offset, &blocksize, &nblocks)) {
+	return NULL;
+    }
+
+    seqbuf buf;
+    if (getseqbuf(&buf, data) < 0) return NULL;
+
+    PyObject* obj = NULL;
+    if (blocksize <= 0 || nblocks < 0 || offset < 0 ||
+	(buf.length-offset)/blocksize < nblocks) {
+	PyErr_SetString(PyExc_ValueError, "Invalid offset/blocksize");
+    } else if ((obj = PyString_FromStringAndSize(NULL, sizeof(ovrecord)*nblocks)) != NULL) {
+	ovrecord* recs = (ovrecord*)PyString_AS_STRING(obj);
+	int i;
+	Py_BEGIN_ALLOW_THREADS
+	for (i = 0; i < nblocks; i++) {
+	    calcoverviews16(&recs[i], blocksize,
+			    &buf.seq[offset+(Py_ssize_t)i*blocksize]);
+	}
+	Py_END_ALLOW_THREADS
+    }
+
+    releaseseqbuf(&buf);
+    return obj;
+}
+
+
+/* pymergeoverviews(data, ratio);
+   merges every ratio overview records into one (the last one may be partial). */
+static PyObject* pymergeoverviews(PyObject* self, PyObject* args)
+{
+    PyObject* data;
+    int ratio;
+
+    if (!PyArg_ParseTuple(args, "Oi", &data, &ratio)) {
+	return NULL;
+    }
+
+    if (ratio <= 0) {
+	PyErr_SetString(PyExc_ValueError, "Invalid ratio");
+	return NULL;
+    }
+
+    seqbuf buf;
+    if (getseqbuf(&buf, data) < 0) return NULL;
+
+    Py_ssize_t n = buf.nbytes / sizeof(ovrecord);
+    Py_ssize_t m = (n+ratio-1) / ratio;
+    PyObject* obj = PyString_FromStringAndSize(NULL, sizeof(ovrecord)*m);
+    if (obj != NULL) {
+	const ovrecord* src = (const ovrecord*)buf.seq;
+	ovrecord* recs = (ovrecord*)PyString_AS_STRING(obj);
+	Py_ssize_t i;
+	Py_BEGIN_ALLOW_THREADS
+	for (i = 0; i < m; i++) {
+	    Py_ssize_t j = i*ratio;
+	    mergeoverviews(&recs[i], (int)((n-j < ratio)? n-j : ratio), &src[j]);
+	}
+	Py_END_ALLOW_THREADS
+    }
+
+    releaseseqbuf(&buf);
+    return obj;
+}
+
+
+/* pyautocorrs16(window0, window1, threshold, maxitems, data, offset, engine=AUTOCORR_AUTO); */
+typedef struct _corritem
+{
+    int dw;
+    double sim;
+    double mag;
+} corritem;
+
+static int cmp_corritem(const void* a, const void* b)
+{
+    double p = ((const corritem*)a)->sim;
+    double q = ((const corritem*)b)->sim;
+    if (p == q) {
+	return 0;
+    } else if (p < q) {
+	return +1;
+    } else {
+	return -1;
+    }
+}
+
+/* findpitches16: run autocorrelation and pick the best windows.
+   sim and items must hold window1-window0+1 elements.
+   Returns the number of items, or -1 if memory cannot be allocated. */
+static int findpitches16(corritem* items, double* sim,
+			 int window0, int window1,
+			 double threshold, int maxitems,
+			 int length, const int16le* seq, int engine)
+{
+    if (engine == AUTOCORR_FFT) {
+	if (autocorrs16fft(sim, window0, window1, length, seq) < 0) return -1;
+    } else {
+	autocorrs16(sim, window0, window1, length, seq);
+    }
+    int wmax = window1-window0+1;
+    int i;
+    int n = 0;
+    for (i = 0; i < wmax; i++) {
+	if (threshold < sim[i]) {
+	    items[n].dw = i;
+	    items[n].sim = sim[i];
+	    items[n].mag = 0;
+	    n++;
+	}
+    }
+    if (n) {
+	qsort(items, n, sizeof(corritem), cmp_corritem);
+	n = max(0, min(n, maxitems));
+    }
+    return n;
+}
+
+static int getengine(int engine, int window0, int window1)
+{
+    if (engine == AUTOCORR_AUTO) {
+	engine = (FFT_MINRANGE <= window1-window0)? AUTOCORR_FFT : AUTOCORR_DIRECT;
+    }
+    if (engine != AUTOCORR_DIRECT && engine != AUTOCORR_FFT) {
+	PyErr_SetString(PyExc_ValueError, "Invalid engine");
+	return -1;
+    }
+    return engine;
+}
+
+static PyObject* pyautocorrs16(PyObject* self, PyObject* args)
+{
+    int window0, window1, maxitems;
     double threshold;
     PyObject* data;
-    int offset;
+    Py_ssize_t offset;
+    int engine = AUTOCORR_AUTO;
 
-    if (!PyArg_ParseTuple(args, "iidiOi",
+    if (!PyArg_ParseTuple(args, "iidiOn|i",
 			  &window0, &window1,
 			  &threshold, &maxitems,
-			  &data, &offset)) {
+			  &data, &offset, &engine)) {
 	return NULL;
     }
 
-    if (!PyString_CheckExact(data)) {
-	PyErr_SetString(PyExc_TypeError, "Must be string");
-	return NULL;
-    }
+    seqbuf buf;
+    if (getseqbuf(&buf, data) < 0) return NULL;
 
-    int length = PyString_Size(data) / sizeof(int16le);
+    Py_ssize_t length = buf.length;
     if (window0 < 0 || window1 < 0 || 
 	offset < 0 || length < offset+window0 || length < offset+window1) {
 	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
+	releaseseqbuf(&buf);
 	return NULL;
     }
 
@@ -314,50 +1284,239 @@ static PyObject* pyautocorrs16(PyObject* self, PyObject* args)
 	window1 = window0;
 	window0 = x;
     }
+
+    engine = getengine(engine, window0, window1);
+    if (engine < 0) {
+	releaseseqbuf(&buf);
+	return NULL;
+    }
     
-    PyObject* result = NULL;
-  
     size_t wmax = window1-window0+1;
-    int16le* seq = (int16le*)PyString_AsString(data);
     double* sim = (double*) PyMem_Malloc(sizeof(double)*wmax);
-    if (sim == NULL) {
+    corritem* items = (corritem*) PyMem_Malloc(sizeof(corritem)*wmax);
+    if (sim == NULL || items == NULL) {
+	PyMem_Free(sim);
+	PyMem_Free(items);
+	releaseseqbuf(&buf);
+	return PyErr_NoMemory();
+    }
+
+    int n;
+    Py_BEGIN_ALLOW_THREADS
+    n = findpitches16(items, sim, window0, window1,
+		      threshold, maxitems,
+		      clamplen(length-offset), &buf.seq[offset], engine);
+    Py_END_ALLOW_THREADS
+    releaseseqbuf(&buf);
+
+    PyObject* result = NULL;
+    if (0 <= n) {
+	int i;
+	result = PyList_New(n);
+	for (i = 0; i < n; i++) {
+	    PyObject* v1 = PyInt_FromLong(items[i].dw + window0);
+	    PyObject* v2 = PyFloat_FromDouble(items[i].sim);
+	    PyObject* tuple = PyTuple_Pack(2, v1, v2);
+	    PyList_SetItem(result, i, tuple);
+	    Py_DECREF(v1);
+	    Py_DECREF(v2);
+	}
+    }
+    PyMem_Free(items);
+    PyMem_Free(sim);
+
+    if (result == NULL) {
 	return PyErr_NoMemory();
+    }
+    return result;
+}
+
+
+/* pyautocorrs16batch(window0, window1, threshold, maxitems, data, offsets,
+   nthreads=1, engine=AUTOCORR_AUTO); */
+typedef struct _batchjob
+{
+    int window0, window1;
+    double threshold;
+    int maxitems;
+    int engine;
+    Py_ssize_t length;
+    const int16le* seq;
+    int nhops;
+    const Py_ssize_t* offsets;
+    corritem* items;		/* nhops*maxitems */
+    int* nitems;		/* nhops */
+    int start, stride;
+    int running;
+    int error;
+} batchjob;
+
+static void* runbatchjob(void* arg)
+{
+    batchjob* job = (batchjob*)arg;
+    size_t wmax = job->window1-job->window0+1;
+    double* sim = (double*) malloc(sizeof(double)*wmax);
+    corritem* items = (corritem*) malloc(sizeof(corritem)*wmax);
+    if (sim == NULL || items == NULL) {
+	job->error = 1;
     } else {
-	autocorrs16(sim, window0, window1, length-offset, &seq[offset]);
-	corritem* items = (corritem*) PyMem_Malloc(sizeof(corritem)*wmax);
-	if (items == NULL) {
-	    return PyErr_NoMemory();
-	} else {
-	    int i;
-	    size_t n = 0;
-	    for (i = 0; i < wmax; i++) {
-		if (threshold < sim[i]) {
-		    items[n].dw = i;
-		    items[n].sim = sim[i];
-		    n++;
-		}
+	int h;
+	for (h = job->start; h < job->nhops; h += job->stride) {
+	    Py_ssize_t offset = job->offsets[h];
+	    const int16le* seq = &job->seq[offset];
+	    int n = findpitches16(items, sim, job->window0, job->window1,
+				  job->threshold, job->maxitems,
+				  clamplen(job->length-offset), seq, job->engine);
+	    if (n < 0) {
+		job->error = 1;
+		break;
 	    }
-	    if (n) {
-		qsort(items, n, sizeof(corritem), cmp_corritem);
-		n = min(n, maxitems);
-		result = PyList_New(n);
-		for (i = 0; i < n; i++) {
-		    PyObject* v1 = PyInt_FromLong(items[i].dw + window0);
-		    PyObject* v2 = PyFloat_FromDouble(items[i].sim);
-		    PyObject* tuple = PyTuple_Pack(2, v1, v2);
-		    PyList_SetItem(result, i, tuple);
-		    Py_DECREF(v1);
-		    Py_DECREF(v2);
-		}
+	    int i;
+	    corritem* dst = &job->items[h*job->maxitems];
+	    for (i = 0; i < n; i++) {
+		dst[i] = items[i];
+		dst[i].mag = calcmags16(items[i].dw + job->window0, seq);
 	    }
-	    PyMem_Free(items);
+	    job->nitems[h] = n;
 	}
-	PyMem_Free(sim);
     }
+    free(items);
+    free(sim);
+    return NULL;
+}
 
-    if (result == NULL) {
-	result = PyList_New(0);
+static PyObject* pyautocorrs16batch(PyObject* self, PyObject* args)
+{
+    int window0, window1, maxitems;
+    double threshold;
+    PyObject* data;
+    PyObject* offsets;
+    int nthreads = 1;
+    int engine = AUTOCORR_AUTO;
+    int h, i;
+    int error = 0;
+
+    if (!PyArg_ParseTuple(args, "iidiOO|ii",
+			  &window0, &window1,
+			  &threshold, &maxitems,
+			  &data, &offsets, &nthreads, &engine)) {
+	return NULL;
     }
+
+    if (window1 < window0) {
+	int x = window1;
+	window1 = window0;
+	window0 = x;
+    }
+
+    engine = getengine(engine, window0, window1);
+    if (engine < 0) return NULL;
+
+    if (nthreads <= 0) {
+	PyErr_SetString(PyExc_ValueError, "Invalid nthreads");
+	return NULL;
+    }
+    maxitems = max(0, maxitems);
+
+    seqbuf buf;
+    if (getseqbuf(&buf, data) < 0) return NULL;
+    PyObject* seqobj = PySequence_Fast(offsets, "Must be sequence");
+    if (seqobj == NULL) {
+	releaseseqbuf(&buf);
+	return NULL;
+    }
+    int nhops = PySequence_Fast_GET_SIZE(seqobj);
+    Py_ssize_t* hops = (Py_ssize_t*) PyMem_Malloc(sizeof(Py_ssize_t)*(nhops+1));
+    int* nitems = (int*) PyMem_Malloc(sizeof(int)*(nhops+1));
+    corritem* items = (corritem*) PyMem_Malloc(sizeof(corritem)*(nhops*maxitems+1));
+    batchjob* jobs = (batchjob*) PyMem_Malloc(sizeof(batchjob)*nthreads);
+    pthread_t* threads = (pthread_t*) PyMem_Malloc(sizeof(pthread_t)*nthreads);
+    PyObject* result = NULL;
+    if (hops == NULL || nitems == NULL || items == NULL ||
+	jobs == NULL || threads == NULL) {
+	PyErr_NoMemory();
+	goto finally;
+    }
+
+    for (h = 0; h < nhops; h++) {
+	Py_ssize_t offset = PyInt_AsSsize_t(PySequence_Fast_GET_ITEM(seqobj, h));
+	if (offset == -1 && PyErr_Occurred()) goto finally;
+	if (window0 < 0 || offset < 0 || buf.length < offset+window1) {
+	    PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
+	    goto finally;
+	}
+	hops[h] = offset;
+	nitems[h] = 0;
+    }
+
+    nthreads = max(1, min(nthreads, nhops));
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < nthreads; i++) {
+	batchjob* job = &jobs[i];
+	job->window0 = window0;
+	job->window1 = window1;
+	job->threshold = threshold;
+	job->maxitems = maxitems;
+	job->engine = engine;
+	job->length = buf.length;
+	job->seq = buf.seq;
+	job->nhops = nhops;
+	job->offsets = hops;
+	job->items = items;
+	job->nitems = nitems;
+	job->start = i;
+	job->stride = nthreads;
+	job->running = 0;
+	job->error = 0;
+    }
+    /* the first job runs in this thread. */
+    for (i = 1; i < nthreads; i++) {
+	jobs[i].running = (pthread_create(&threads[i], NULL, runbatchjob, &jobs[i]) == 0);
+    }
+    runbatchjob(&jobs[0]);
+    for (i = 1; i < nthreads; i++) {
+	if (jobs[i].running) {
+	    pthread_join(threads[i], NULL);
+	} else {
+	    /* the thread could not be started. */
+	    runbatchjob(&jobs[i]);
+	}
+    }
+    for (i = 0; i < nthreads; i++) {
+	error |= jobs[i].error;
+    }
+    Py_END_ALLOW_THREADS
+
+    if (error) {
+	PyErr_NoMemory();
+	goto finally;
+    }
+
+    result = PyList_New(nhops);
+    for (h = 0; h < nhops; h++) {
+	PyObject* r = PyList_New(nitems[h]);
+	corritem* src = &items[h*maxitems];
+	for (i = 0; i < nitems[h]; i++) {
+	    PyObject* v1 = PyInt_FromLong(src[i].dw + window0);
+	    PyObject* v2 = PyFloat_FromDouble(src[i].sim);
+	    PyObject* v3 = PyFloat_FromDouble(src[i].mag);
+	    PyObject* tuple = PyTuple_Pack(3, v1, v2, v3);
+	    PyList_SetItem(r, i, tuple);
+	    Py_DECREF(v1);
+	    Py_DECREF(v2);
+	    Py_DECREF(v3);
+	}
+	PyList_SetItem(result, h, r);
+    }
+
+finally:
+    PyMem_Free(threads);
+    PyMem_Free(jobs);
+    PyMem_Free(items);
+    PyMem_Free(nitems);
+    PyMem_Free(hops);
+    Py_DECREF(seqobj);
+    releaseseqbuf(&buf);
     return result;
 }
 
@@ -374,25 +1533,32 @@ static PyObject* pyautosplices16(PyObject* self, PyObject* args)
 	return NULL;
     }
 
-    if (!PyString_CheckExact(data1) ||
-	!PyString_CheckExact(data2)) {
-	PyErr_SetString(PyExc_TypeError, "Must be string");
+    seqbuf buf1, buf2;
+    if (getseqbuf(&buf1, data1) < 0) return NULL;
+    if (getseqbuf(&buf2, data2) < 0) {
+	releaseseqbuf(&buf1);
 	return NULL;
     }
 
-    int length1 = PyString_Size(data1) / sizeof(int16le);
-    int length2 = PyString_Size(data2) / sizeof(int16le);
+    int length1 = clamplen(buf1.length);
+    int length2 = clamplen(buf2.length);
     if (window0 < 0 || window1 < 0 ||
 	length1 < window0 || length1 < window1 ||
 	length2 < window0 || length2 < window1) {
 	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
+	releaseseqbuf(&buf2);
+	releaseseqbuf(&buf1);
 	return NULL;
     }
 
-    int16le* seq1 = (int16le*)PyString_AsString(data1);
-    int16le* seq2 = (int16le*)PyString_AsString(data2);  
     double smax = 0;
-    int wmax = autosplices16(&smax, window0, window1, length1, seq1, length2, seq2);
+    int wmax;
+    Py_BEGIN_ALLOW_THREADS
+    wmax = autosplices16(&smax, window0, window1,
+			 length1, buf1.seq, length2, buf2.seq);
+    Py_END_ALLOW_THREADS
+    releaseseqbuf(&buf2);
+    releaseseqbuf(&buf1);
   
     PyObject* tuple;
     {
@@ -412,92 +1578,403 @@ static PyObject* pyautosplices16(PyObject* self, PyObject* args)
 static PyObject* pypsolas16(PyObject* self, PyObject* args)
 {
     int outlen;
-    int offset1, offset2;
+    Py_ssize_t offset1, offset2;
     int window1, window2;
     PyObject* data1;
     PyObject* data2;
 
-    if (!PyArg_ParseTuple(args, "iiiOiiO", &outlen,
+    if (!PyArg_ParseTuple(args, "iniOniO", &outlen,
 			  &offset1, &window1, &data1,
 			  &offset2, &window2, &data2)) {
 	return NULL;
     }
-  
-    if (!PyString_CheckExact(data1) ||
-	!PyString_CheckExact(data2)) {
-	PyErr_SetString(PyExc_TypeError, "Must be string");
+
+    seqbuf buf1, buf2;
+    if (getseqbuf(&buf1, data1) < 0) return NULL;
+    if (getseqbuf(&buf2, data2) < 0) {
+	releaseseqbuf(&buf1);
 	return NULL;
     }
 
-    int length1 = PyString_Size(data1) / sizeof(int16le);
-    int length2 = PyString_Size(data2) / sizeof(int16le);
+    PyObject* obj = NULL;
+    int16le* out = NULL;
     if (window1 < 0 || window2 < 0 || 
-	offset1 < 0 || length1 < offset1+window1 ||
-	offset2 < 0 || length2 < offset2+window2) {
+	offset1 < 0 || buf1.length < offset1+window1 ||
+	offset2 < 0 || buf2.length < offset2+window2) {
 	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
+    } else if (outlen <= 0) {
+	PyErr_SetString(PyExc_ValueError, "Invalid outlen");
+    } else if ((out = (int16le*) PyMem_Malloc(sizeof(int16le)*outlen)) == NULL) {
+	PyErr_NoMemory();
+    } else {
+	Py_BEGIN_ALLOW_THREADS
+	psolas16(outlen, out,
+		 window1, &buf1.seq[offset1],
+		 window2, &buf2.seq[offset2]);
+	Py_END_ALLOW_THREADS
+	obj = PyString_FromStringAndSize((char*)out, sizeof(int16le)*outlen);
+	PyMem_Free(out);
+    }
+
+    releaseseqbuf(&buf2);
+    releaseseqbuf(&buf1);
+    return obj;
+}
+
+
+/* pypsolas16into(out, outoffset, outlen,
+   offset1, window1, data1,
+   offset2, window2, data2, mode=PSOLA_SET);
+   writes (or adds) outlen samples to out[outoffset:].
+   out holds int16 samples, or float32 samples if mode is PSOLA_ADDF. */
+static PyObject* pypsolas16into(PyObject* self, PyObject* args)
+{
+    PyObject* dst;
+    Py_ssize_t outoffset;
+    int outlen;
+    Py_ssize_t offset1, offset2;
+    int window1, window2;
+    PyObject* data1;
+    PyObject* data2;
+    int mode = PSOLA_SET;
+
+    if (!PyArg_ParseTuple(args, "OniniOniO|i", &dst, &outoffset, &outlen,
+			  &offset1, &window1, &data1,
+			  &offset2, &window2, &data2, &mode)) {
 	return NULL;
     }
 
-    if (outlen <= 0) {
-	PyErr_SetString(PyExc_ValueError, "Invalid outlen");
+    if (mode != PSOLA_SET && mode != PSOLA_ADD && mode != PSOLA_ADDF) {
+	PyErr_SetString(PyExc_ValueError, "Invalid mode");
 	return NULL;
     }
 
-    int16le* out = (int16le*) PyMem_Malloc(sizeof(int16le)*outlen);
-    if (out == NULL) return PyErr_NoMemory();
+    seqbuf outbuf, buf1, buf2;
+    void* out;
+    if (getoutbuf(&outbuf, dst, &out) < 0) return NULL;
+    if (getseqbuf(&buf1, data1) < 0) {
+	releaseseqbuf(&outbuf);
+	return NULL;
+    }
+    if (getseqbuf(&buf2, data2) < 0) {
+	releaseseqbuf(&buf1);
+	releaseseqbuf(&outbuf);
+	return NULL;
+    }
 
-    int16le* seq1 = (int16le*)PyString_AsString(data1);
-    int16le* seq2 = (int16le*)PyString_AsString(data2);
-    psolas16(outlen, out, window1, &seq1[offset1], window2, &seq2[offset2]);
-    PyObject* obj = PyString_FromStringAndSize((char*)out, sizeof(int16le)*outlen);
-    PyMem_Free(out);
-  
+    PyObject* obj = NULL;
+    size_t size = (mode == PSOLA_ADDF)? sizeof(float) : sizeof(int16le);
+    Py_ssize_t capacity = outbuf.nbytes / size;
+    if (window1 < 0 || window2 < 0 || 
+	offset1 < 0 || buf1.length < offset1+window1 ||
+	offset2 < 0 || buf2.length < offset2+window2) {
+	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
+    } else if (outlen <= 0 || outoffset < 0 || capacity < outoffset+outlen) {
+	PyErr_SetString(PyExc_ValueError, "Invalid outoffset/outlen");
+    } else {
+	PyThreadState* save = NULL;
+	if (outbuf.locked) {
+	    save = PyEval_SaveThread();
+	}
+	psolaadds16(mode, outlen, (char*)out + size*outoffset,
+		    window1, &buf1.seq[offset1],
+		    window2, &buf2.seq[offset2]);
+	if (save != NULL) {
+	    PyEval_RestoreThread(save);
+	}
+	Py_INCREF(Py_None);
+	obj = Py_None;
+    }
+
+    releaseseqbuf(&buf2);
+    releaseseqbuf(&buf1);
+    releaseseqbuf(&outbuf);
     return obj;
 }
 
 
-/* pymatchs16(pat, offset, window, data); */
-static PyObject* pymatchs16(PyObject* self, PyObject* args)
+/* pymatchs16(pat, offset, window, data, engine=AUTOCORR_AUTO); */
+static int runmatchs16(int* pdmax, double* psim, PyObject* args)
 {
     PyObject* pat;
     PyObject* data;
-    int offset;
+    Py_ssize_t offset;
+    int window;
+    int engine = AUTOCORR_AUTO;
+
+    if (!PyArg_ParseTuple(args, "OniO|i",
+			  &pat, &offset, &window, &data, &engine)) {
+	return -1;
+    }
+
+    seqbuf buf1, buf2;
+    if (getseqbuf(&buf1, pat) < 0) return -1;
+    if (getseqbuf(&buf2, data) < 0) {
+	releaseseqbuf(&buf1);
+	return -1;
+    }
+
+    int patlen = clamplen(buf1.length);
+    int result = 0;
+    if (window < 0 || offset < 0 || buf2.length < offset+window) {
+	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
+	result = -1;
+    } else {
+	if (engine == AUTOCORR_AUTO) {
+	    engine = (FFT_MINMATCH <= min(patlen, window))? AUTOCORR_FFT : AUTOCORR_DIRECT;
+	}
+	if (engine == AUTOCORR_FFT) {
+	    Py_BEGIN_ALLOW_THREADS
+	    result = matchs16fft(pdmax, psim, patlen, buf1.seq,
+				 window, &buf2.seq[offset]);
+	    Py_END_ALLOW_THREADS
+	    if (result < 0) {
+		PyErr_NoMemory();
+	    }
+	} else if (engine == AUTOCORR_DIRECT) {
+	    Py_BEGIN_ALLOW_THREADS
+	    *pdmax = matchs16(psim, patlen, buf1.seq,
+			      window, &buf2.seq[offset]);
+	    Py_END_ALLOW_THREADS
+	} else {
+	    PyErr_SetString(PyExc_ValueError, "Invalid engine");
+	    result = -1;
+	}
+    }
+
+    releaseseqbuf(&buf2);
+    releaseseqbuf(&buf1);
+    return result;
+}
+
+static PyObject* pymatchs16(PyObject* self, PyObject* args)
+{
+    int dmax;
+    double smax;
+    if (runmatchs16(&dmax, &smax, args) < 0) return NULL;
+    return PyFloat_FromDouble(smax);
+}
+
+/* pyfindmatchs16(pat, offset, window, data, engine=AUTOCORR_AUTO); */
+static PyObject* pyfindmatchs16(PyObject* self, PyObject* args)
+{
+    int dmax;
+    double smax;
+    if (runmatchs16(&dmax, &smax, args) < 0) return NULL;
+
+    PyObject* tuple;
+    {
+	PyObject* v1 = PyInt_FromLong(dmax);
+	PyObject* v2 = PyFloat_FromDouble(smax);
+	tuple = PyTuple_Pack(2, v1, v2);
+	Py_DECREF(v1);
+	Py_DECREF(v2);
+    }
+    return tuple;
+}
+
+
+/* pymakematchprof16(pat, window); */
+static PyObject* pymakematchprof16(PyObject* self, PyObject* args)
+{
+    PyObject* pat;
     int window;
 
-    if (!PyArg_ParseTuple(args, "OiiO",
-			  &pat, &offset, &window, &data)) {
+    if (!PyArg_ParseTuple(args, "Oi", &pat, &window)) {
 	return NULL;
     }
-  
-    if (!PyString_CheckExact(pat) ||
-	!PyString_CheckExact(data)) {
-	PyErr_SetString(PyExc_TypeError, "Must be string");
+
+    seqbuf buf;
+    if (getseqbuf(&buf, pat) < 0) return NULL;
+
+    PyObject* obj = NULL;
+    int patlen = clamplen(buf.length);
+    if (window <= 0 || patlen <= 0) {
+	PyErr_SetString(PyExc_ValueError, "Invalid pattern/window");
+    } else {
+	size_t size = matchprofsize16(patlen, window);
+	obj = PyString_FromStringAndSize(NULL, size);
+	if (obj != NULL) {
+	    char* out = PyString_AS_STRING(obj);
+	    int result;
+	    Py_BEGIN_ALLOW_THREADS
+	    result = makematchprof16(out, patlen, buf.seq, window);
+	    Py_END_ALLOW_THREADS
+	    if (result < 0) {
+		Py_DECREF(obj);
+		obj = PyErr_NoMemory();
+	    }
+	}
+    }
+
+    releaseseqbuf(&buf);
+    return obj;
+}
+
+/* pymatchprofs16(prof, data, offset, minsim=-1); */
+static PyObject* pymatchprofs16(PyObject* self, PyObject* args)
+{
+    PyObject* prof;
+    PyObject* data;
+    Py_ssize_t offset;
+    double minsim = -1;
+
+    if (!PyArg_ParseTuple(args, "OOn|d", &prof, &data, &offset, &minsim)) {
+	return NULL;
+    }
+
+    seqbuf buf1, buf2;
+    if (getseqbuf(&buf1, prof) < 0) return NULL;
+    if (getseqbuf(&buf2, data) < 0) {
+	releaseseqbuf(&buf1);
 	return NULL;
     }
 
-    int patlen = PyString_Size(pat) / sizeof(int16le);
-    int datalen = PyString_Size(data) / sizeof(int16le);
-    if (datalen < offset+window) {
+    PyObject* tuple = NULL;
+    matchprof16 header;
+    if (buf1.nbytes < (Py_ssize_t)sizeof(header)) {
+	PyErr_SetString(PyExc_ValueError, "Invalid profile");
+	goto finally;
+    }
+    memcpy(&header, buf1.seq, sizeof(header));
+    if (header.patlen <= 0 || header.window <= 0 ||
+	buf1.nbytes != (Py_ssize_t)matchprofsize16(header.patlen, header.window)) {
+	PyErr_SetString(PyExc_ValueError, "Invalid profile");
+	goto finally;
+    }
+    if (offset < 0 || buf2.length < offset+header.window) {
 	PyErr_SetString(PyExc_ValueError, "Invalid offset/window");
+	goto finally;
+    }
+
+    int dmax;
+    double smax;
+    int result;
+    Py_BEGIN_ALLOW_THREADS
+    result = matchprofs16(&dmax, &smax, buf1.seq, &buf2.seq[offset], minsim);
+    Py_END_ALLOW_THREADS
+    if (result < 0) {
+	PyErr_NoMemory();
+	goto finally;
+    }
+    {
+	PyObject* v1 = PyInt_FromLong(dmax);
+	PyObject* v2 = PyFloat_FromDouble(smax);
+	tuple = PyTuple_Pack(2, v1, v2);
+	Py_DECREF(v1);
+	Py_DECREF(v2);
+    }
+
+finally:
+    releaseseqbuf(&buf2);
+    releaseseqbuf(&buf1);
+    return tuple;
+}
+
+
+/* pypcmtos16(data, sampwidth, nchannels=1, channel=-1, format=FORMAT_PCM); */
+static PyObject* pypcmtos16(PyObject* self, PyObject* args)
+{
+    PyObject* data;
+    int sampwidth;
+    int nchannels = 1;
+    int channel = -1;
+    int format = FORMAT_PCM;
+
+    if (!PyArg_ParseTuple(args, "Oi|iii", &data, &sampwidth,
+			  &nchannels, &channel, &format)) {
 	return NULL;
     }
 
-    int16le* seq1 = (int16le*)PyString_AsString(pat);
-    int16le* seq2 = (int16le*)PyString_AsString(data);
-    /* find the maximum similarity. */
-    int dmax = -1;
-    double smax = -1;
-    int d;
-    for (d = 0; d < window; d++) { 
-	double s = calcmatchs16(patlen, seq1, 
-				window, &seq2[offset], d);
-	if (smax < s) {
-	    dmax = d;
-	    smax = s;
-	}
+    if (!checkformat(sampwidth, format)) {
+	PyErr_SetString(PyExc_ValueError, "Invalid sample format");
+	return NULL;
     }
-  
-    return PyFloat_FromDouble(smax);
+    if (nchannels <= 0 || nchannels <= channel) {
+	PyErr_SetString(PyExc_ValueError, "Invalid channel");
+	return NULL;
+    }
+
+    seqbuf buf;
+    if (getseqbuf(&buf, data) < 0) return NULL;
+
+    Py_ssize_t n = buf.nbytes / (sampwidth*nchannels);
+    PyObject* obj = PyString_FromStringAndSize(NULL, sizeof(int16le)*n);
+    if (obj != NULL) {
+	int16le* out = (int16le*)PyString_AS_STRING(obj);
+	Py_BEGIN_ALLOW_THREADS
+	pcmtos16(n, out, sampwidth, format, nchannels, channel, buf.seq);
+	Py_END_ALLOW_THREADS
+    }
+
+    releaseseqbuf(&buf);
+    return obj;
+}
+
+
+/* pypcmtofloat32(data, sampwidth, format=FORMAT_PCM); */
+static PyObject* pypcmtofloat32(PyObject* self, PyObject* args)
+{
+    PyObject* data;
+    int sampwidth;
+    int format = FORMAT_PCM;
+
+    if (!PyArg_ParseTuple(args, "Oi|i", &data, &sampwidth, &format)) {
+	return NULL;
+    }
+
+    if (!checkformat(sampwidth, format)) {
+	PyErr_SetString(PyExc_ValueError, "Invalid sample format");
+	return NULL;
+    }
+
+    seqbuf buf;
+    if (getseqbuf(&buf, data) < 0) return NULL;
+
+    Py_ssize_t n = buf.nbytes / sampwidth;
+    PyObject* obj = PyString_FromStringAndSize(NULL, sizeof(float)*n);
+    if (obj != NULL) {
+	float* out = (float*)PyString_AS_STRING(obj);
+	Py_BEGIN_ALLOW_THREADS
+	pcmtofloat32(n, out, sampwidth, format, buf.seq);
+	Py_END_ALLOW_THREADS
+    }
+
+    releaseseqbuf(&buf);
+    return obj;
+}
+
+
+/* pyfloat32topcm(data, sampwidth, format=FORMAT_PCM); */
+static PyObject* pyfloat32topcm(PyObject* self, PyObject* args)
+{
+    PyObject* data;
+    int sampwidth;
+    int format = FORMAT_PCM;
+
+    if (!PyArg_ParseTuple(args, "Oi|i", &data, &sampwidth, &format)) {
+	return NULL;
+    }
+
+    if (!checkformat(sampwidth, format)) {
+	PyErr_SetString(PyExc_ValueError, "Invalid sample format");
+	return NULL;
+    }
+
+    seqbuf buf;
+    if (getseqbuf(&buf, data) < 0) return NULL;
+
+    Py_ssize_t n = buf.nbytes / sizeof(float);
+    PyObject* obj = PyString_FromStringAndSize(NULL, sampwidth*n);
+    if (obj != NULL) {
+	void* out = PyString_AS_STRING(obj);
+	Py_BEGIN_ALLOW_THREADS
+	float32topcm(n, out, sampwidth, format, (const float*)buf.seq);
+	Py_END_ALLOW_THREADS
+    }
+
+    releaseseqbuf(&buf);
+    return obj;
 }
 
 
@@ -512,20 +1989,62 @@ initwavcorr(void)
 	{ "calcmags16", (PyCFunction)pycalcmags16, METH_VARARGS,
 	  "calcmags16"
 	},
+	{ "blockstats16", (PyCFunction)pyblockstats16, METH_VARARGS,
+	  "blockstats16"
+	},
+	{ "overviews16", (PyCFunction)pyoverviews16, METH_VARARGS,
+	  "overviews16"
+	},
+	{ "mergeoverviews", (PyCFunction)pymergeoverviews, METH_VARARGS,
+	  "mergeoverviews"
+	},
 	{ "autocorrs16", (PyCFunction)pyautocorrs16, METH_VARARGS,
 	  "autocorrs16"
 	},
+	{ "autocorrs16batch", (PyCFunction)pyautocorrs16batch, METH_VARARGS,
+	  "autocorrs16batch"
+	},
 	{ "autosplices16", (PyCFunction)pyautosplices16, METH_VARARGS,
 	  "autosplices16"
 	},
 	{ "psolas16", (PyCFunction)pypsolas16, METH_VARARGS,
 	  "psolas16"
 	},
+	{ "psolas16into", (PyCFunction)pypsolas16into, METH_VARARGS,
+	  "psolas16into"
+	},
 	{ "matchs16", (PyCFunction)pymatchs16, METH_VARARGS,
 	  "matchs16"
 	},
+	{ "findmatchs16", (PyCFunction)pyfindmatchs16, METH_VARARGS,
+	  "findmatchs16"
+	},
+	{ "makematchprof16", (PyCFunction)pymakematchprof16, METH_VARARGS,
+	  "makematchprof16"
+	},
+	{ "matchprofs16", (PyCFunction)pymatchprofs16, METH_VARARGS,
+	  "matchprofs16"
+	},
+	{ "pcmtos16", (PyCFunction)pypcmtos16, METH_VARARGS,
+	  "pcmtos16"
+	},
+	{ "pcmtofloat32", (PyCFunction)pypcmtofloat32, METH_VARARGS,
+	  "pcmtofloat32"
+	},
+	{ "float32topcm", (PyCFunction)pyfloat32topcm, METH_VARARGS,
+	  "float32topcm"
+	},
 	{NULL, NULL},
     };
 
-    Py_InitModule3("wavcorr", functions, "wavcorr"); 
+    PyObject* module = Py_InitModule3("wavcorr", functions, "wavcorr"); 
+    if (module == NULL) return;
+    PyModule_AddIntConstant(module, "AUTOCORR_AUTO", AUTOCORR_AUTO);
+    PyModule_AddIntConstant(module, "AUTOCORR_DIRECT", AUTOCORR_DIRECT);
+    PyModule_AddIntConstant(module, "AUTOCORR_FFT", AUTOCORR_FFT);
+    PyModule_AddIntConstant(module, "PSOLA_SET", PSOLA_SET);
+    PyModule_AddIntConstant(module, "PSOLA_ADD", PSOLA_ADD);
+    PyModule_AddIntConstant(module, "PSOLA_ADDF", PSOLA_ADDF);
+    PyModule_AddIntConstant(module, "FORMAT_PCM", FORMAT_PCM);
+    PyModule_AddIntConstant(module, "FORMAT_FLOAT", FORMAT_FLOAT);
 }
@@ -122,6 +122,7 @@ class WavEd(object):
         self._cur = None
         self._curs = {}
         self._player = None
+        self._overview = None
         return
 
     def stop(self):
@@ -132,6 +133,9 @@ class WavEd(object):
 
     def close(self):
         self.stop()
+        if self._overview is not None:
+            self._overview.close()
+            self._overview = None
         if self._wav is not None:
             self._wav.close()
             self._wav = None
@@ -142,6 +146,7 @@ class WavEd(object):
     def read(self, path):
         self.close()
         self._wav = WaveReader(path)
+        self._path = path
         self._cur = WavCursor(self._wav)
         self._cur.set_length('1.0')
         self._curs = {}
@@ -153,22 +158,77 @@ class WavEd(object):
     def write(self, cur, path, force=False):
         if not force and os.path.exists(path):
             raise WavEdError('File exists: %r' % path)
-        nframes = cur.get_length()
-        fp = open(path, 'wb')
-        writer = WaveWriter(fp,
-                            nchannels=self._wav.nchannels,
-                            sampwidth=self._wav.sampwidth,
-                            framerate=self._wav.framerate)
-        self._wav.seek(cur.start)
-        (_,data) = self._wav.readraw(nframes)
-        writer.writeraw(data)
-        writer.close()
-        fp.close()
-        print ('Written: %r, rate=%d, frames=%d, duration=%.3f' %
-               (path, writer.framerate, nframes,
-                nframes/float(writer.framerate)))
+        self.write_ranges([(cur, path)])
         return
 
+    # write_ranges: writes [(cursor, path), ...] in a single pass.
+    # The file is read in chunks in the order of the offsets and
+    # each chunk is written to all the ranges that contain it,
+    # so only the ranges that overlap are open at a time.
+    # When more than maxopen ranges overlap, the rest are
+    # written in another pass.
+    def write_ranges(self, targets, chunksize=65536, maxopen=64):
+        ranges = []
+        for (cur,path) in targets:
+            (start, end) = (cur.start, min(cur.get_end(), self._wav.nframes))
+            if end <= start: raise WavRangeError('empty range')
+            ranges.append((start, end, path))
+        ranges.sort()
+        while ranges:
+            ranges = self._write_pass(ranges, chunksize, maxopen)
+        return
+
+    # _write_pass: writes the ranges and returns the ones deferred.
+    def _write_pass(self, ranges, chunksize, maxopen):
+        deferred = []
+        active = []
+        i = 0
+        pos = 0
+        try:
+            while i < len(ranges) or active:
+                if not active:
+                    pos = max(pos, ranges[i][0])
+                while i < len(ranges) and ranges[i][0] <= pos:
+                    (start, end, path) = ranges[i]
+                    i += 1
+                    if maxopen <= len(active):
+                        deferred.append((start, end, path))
+                        continue
+                    fp = open(path, 'wb')
+                    active.append((end, fp, None, path))
+                    writer = WaveWriter(fp,
+                                        nchannels=self._wav.nchannels,
+                                        sampwidth=self._wav.sampwidth,
+                                        framerate=self._wav.framerate,
+                                        nframes=end-start,
+                                        format=self._wav.format)
+                    active[-1] = (end, fp, writer, path)
+                # Read up to the next start or end of a range.
+                e1 = min( e for (e,_,_,_) in active )
+                if i < len(ranges):
+                    e1 = min(e1, ranges[i][0])
+                e1 = min(e1, pos+chunksize)
+                if self._wav.tell() != pos:
+                    self._wav.seek(pos)
+                (_,data) = self._wav.readraw(e1-pos)
+                for (_,_,writer,_) in active:
+                    writer.writeraw(data)
+                pos = e1
+                for (end,fp,writer,path) in active:
+                    if pos < end: continue
+                    writer.close()
+                    fp.close()
+                    print ('Written: %r, rate=%d, frames=%d, duration=%.3f' %
+                           (path, writer.framerate, writer.nframes,
+                            writer.nframes/float(writer.framerate)))
+                active = [ x for x in active if pos < x[0] ]
+        finally:
+            # Remove the files left unfinished by an error.
+            for (_,fp,_,path) in active:
+                fp.close()
+                os.remove(path)
+        return deferred
+
     def play(self, cur):
         nframes = cur.get_length()
         self.stop()
@@ -185,6 +245,14 @@ class WavEd(object):
         print cur
         return
 
+    def show_level(self, cur):
+        from overview import open_overview
+        if self._overview is None:
+            self._overview = open_overview(self._path, src=self._wav)
+        (m0,m1,rms) = self._overview.query(cur.start, cur.get_end())
+        print '%r: min=%.4f, max=%.4f, rms=%.4f' % (cur, m0, m1, rms)
+        return
+
     def run(self):
         self.exec_command('p')
         while 1:
@@ -199,7 +267,7 @@ class WavEd(object):
         return
 
     def show_help(self):
-        print 'commands: q)uit, r)ead, w)rite, p)lay, s)tart, e)nd, l)ength'
+        print 'commands: q)uit, r)ead, w)rite, p)lay, s)tart, e)nd, l)ength, i)nfo'
         print '          C)reate, D)elete, R)ename, J)ump, L)ist, load, save, export'
         return
     
@@ -254,6 +322,11 @@ class WavEd(object):
         self.play(self._cur)
         return
     
+    def cmd_i(self, v):
+        if self._cur is None: raise WavNoFileError
+        self.show_level(self._cur)
+        return
+    
     def cmd_s(self, v):
         if self._cur is None: raise WavNoFileError
         self._cur.set_start(v)
@@ -342,12 +415,20 @@ class WavEd(object):
         return
 
     def cmd_export(self, v):
+        if self._wav is None: raise WavNoFileError
+        targets = []
         for k in sorted(self._curs.keys()):
             c = self._curs[k]
+            path = c.name+'.wav'
             try:
-                self.write(c, c.name+'.wav')
+                if os.path.exists(path):
+                    raise WavEdError('File exists: %r' % path)
+                if min(c.get_end(), self._wav.nframes) <= c.start:
+                    raise WavRangeError('empty range: %r' % c)
+                targets.append((c, path))
             except WavEdError, e:
                 print e
+        self.write_ranges(targets)
         return
     
 
@@ -1,60 +1,264 @@
 #!/usr/bin/env python
 import sys
 import wave
+import mmap
 import struct
 import array
 import subprocess
+from math import floor
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import wavcorr
+except ImportError:
+    wavcorr = None
+
+
+# Sample formats (WAVE format tags).
+FORMAT_PCM = 0x0001
+FORMAT_FLOAT = 0x0003
+FORMAT_EXTENSIBLE = 0xfffe
+
+
+##  Sample conversion
+##
+##  A block of samples is a numpy float32 array if NumPy is available,
+##  or an array('f') otherwise. 8, 16, 24 and 32-bit PCM and
+##  32-bit float samples are supported.
+##
+def pcm2block(data, sampwidth, format=FORMAT_PCM):
+    if numpy is not None:
+        if format == FORMAT_FLOAT:
+            return numpy.frombuffer(data, dtype='<f4').astype(numpy.float32)
+        elif sampwidth == 1:
+            a = numpy.frombuffer(data, dtype=numpy.uint8).astype(numpy.float32)
+            return (a-128.0)*(1.0/128.0)
+        elif sampwidth == 2:
+            a = numpy.frombuffer(data, dtype='<i2').astype(numpy.float32)
+            return a*(1.0/32768.0)
+        elif sampwidth == 3:
+            b = numpy.frombuffer(data, dtype=numpy.uint8)
+            b = b[:len(b)-len(b)%3].reshape(-1, 3).astype(numpy.int32)
+            a = ((b[:,0] << 8) | (b[:,1] << 16) | (b[:,2] << 24)) >> 8
+            return a.astype(numpy.float32)*(1.0/8388608.0)
+        else:
+            a = numpy.frombuffer(data, dtype='<i4').astype(numpy.float32)
+            return a*(1.0/2147483648.0)
+    a = array.array('f')
+    if wavcorr is not None:
+        a.fromstring(wavcorr.pcmtofloat32(data, sampwidth, format))
+    elif format == FORMAT_FLOAT:
+        a.fromstring(str(data))
+    elif sampwidth == 1:
+        b = array.array('B')
+        b.fromstring(data)
+        a.extend( (x-128)*(1.0/128.0) for x in b )
+    elif sampwidth == 2:
+        b = array.array('h')
+        b.fromstring(data)
+        a.extend( x*(1.0/32768.0) for x in b )
+    else:
+        data = str(data)
+        for i in xrange(0, len(data)-sampwidth+1, sampwidth):
+            x = struct.unpack('<l', '\0'*(4-sampwidth)+data[i:i+sampwidth])[0]
+            a.append(x*(1.0/2147483648.0))
+    return a
+
+def block2pcm(block, sampwidth, format=FORMAT_PCM):
+    if numpy is not None:
+        if hasattr(block, '__len__'):
+            a = numpy.asarray(block, dtype=numpy.float64)
+        else:
+            a = numpy.fromiter(block, dtype=numpy.float64)
+        if format == FORMAT_FLOAT:
+            a = a.astype('<f4')
+        elif sampwidth == 1:
+            a = numpy.clip(a*127.0+128.0, 0, 255).astype(numpy.uint8)
+        elif sampwidth == 2:
+            a = numpy.clip(a*32767.0, -32768, 32767).astype('<i2')
+        elif sampwidth == 3:
+            a = numpy.clip(a*8388607.0, -8388608, 8388607).astype('<i4')
+            a = a.view(numpy.uint8).reshape(-1, 4)[:,:3]
+        else:
+            a = numpy.clip(a*2147483647.0, -2147483648.0, 2147483647.0).astype('<i4')
+        return a.tostring()
+    if not isinstance(block, array.array) or block.typecode != 'f':
+        block = array.array('f', block)
+    if wavcorr is not None:
+        return wavcorr.float32topcm(block, sampwidth, format)
+    elif format == FORMAT_FLOAT:
+        return block.tostring()
+    elif sampwidth == 1:
+        a = [ int(max(0.0, min(255.0, x*127.0+128.0))) for x in block ]
+        return array.array('B', a).tostring()
+    elif sampwidth == 2:
+        a = [ int(max(-32768.0, min(32767.0, x*32767.0))) for x in block ]
+        return array.array('h', a).tostring()
+    else:
+        scale = (1 << (sampwidth*8-1))-1
+        return ''.join( struct.pack('<l', int(max(-scale-1, min(scale, x*scale))))[:sampwidth]
+                        for x in block )
+
+# selectchannel: takes one channel (or the average of all
+# the channels if channel < 0) from an interleaved block.
+def selectchannel(block, nchannels, channel=-1):
+    if nchannels == 1:
+        return block
+    if numpy is not None:
+        a = block[:len(block)-len(block)%nchannels].reshape(-1, nchannels)
+        if channel < 0:
+            return a.mean(axis=1).astype(numpy.float32)
+        return a[:,channel].copy()
+    if 0 <= channel:
+        return block[channel::nchannels]
+    n = len(block)/nchannels
+    a = array.array('f', block[0:n*nchannels:nchannels])
+    for c in xrange(1, nchannels):
+        for (i,x) in enumerate(block[c:n*nchannels:nchannels]):
+            a[i] += x
+    for i in xrange(n):
+        a[i] /= nchannels
+    return a
 
 
 ##  WaveReader
 ##
 class WaveReader(object):
 
-    def __init__(self, path):
-        self._fp = wave.open(path)
-        self.nchannels = self._fp.getnchannels()
-        self.sampwidth = self._fp.getsampwidth()
-        self.framerate = self._fp.getframerate()
-        self.nframes = self._fp.getnframes()
+    def __init__(self, path, use_mmap=True):
+        self._fp = None
+        self._mmap = None
+        if use_mmap:
+            try:
+                self._open_mmap(path)
+            except (ValueError, EnvironmentError, mmap.error, struct.error):
+                self._mmap = None
+        if self._mmap is None:
+            self._fp = wave.open(path)
+            self.nchannels = self._fp.getnchannels()
+            self.sampwidth = self._fp.getsampwidth()
+            self.framerate = self._fp.getframerate()
+            self.nframes = self._fp.getnframes()
+            self.format = FORMAT_PCM
+        self._pos = 0
         self._nframesleft = self.nframes
-        if self.sampwidth == 1:
-            self.ratio = 1.0/256.0
-            self.arraytype = 'b'
-        else:
-            self.ratio = 1.0/32768.0
-            self.arraytype = 'h'
+        return
+
+    def _open_mmap(self, path):
+        # Parse the RIFF header and map the whole file.
+        fp = open(path, 'rb')
+        try:
+            m = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            fp.close()
+        if m[0:4] != 'RIFF' or m[8:12] != 'WAVE': raise ValueError('not a wave file')
+        fmt = None
+        data = None
+        i = 12
+        while i+8 <= len(m):
+            (name, size) = struct.unpack('<4sL', m[i:i+8])
+            i += 8
+            if name == 'fmt ':
+                fmt = struct.unpack('<HHLLHH', m[i:i+16])
+                if fmt[0] == FORMAT_EXTENSIBLE and 26 <= size:
+                    # The first two bytes of SubFormat is the format tag.
+                    (tag,) = struct.unpack('<H', m[i+24:i+26])
+                    fmt = (tag,)+fmt[1:]
+            elif name == 'data':
+                data = (i, min(size, len(m)-i))
+                break
+            i += size + (size & 1)
+        if fmt is None or data is None: raise ValueError('no fmt/data chunk')
+        (fmttag, nchannels, framerate, _, _, bits) = fmt
+        if fmttag not in (FORMAT_PCM, FORMAT_FLOAT): raise ValueError('unsupported format')
+        if fmttag == FORMAT_FLOAT and bits != 32: raise ValueError('unsupported format')
+        if nchannels == 0 or not (1 <= (bits+7)/8 <= 4): raise ValueError('unsupported format')
+        self.format = fmttag
+        self.nchannels = nchannels
+        self.sampwidth = (bits+7)/8
+        self.framerate = framerate
+        self._framesize = self.nchannels*self.sampwidth
+        (self._data, datalen) = data
+        self.nframes = datalen / self._framesize
+        self._mmap = m
         return
 
     def __len__(self):
         return self.nframes
 
     def close(self):
-        self._fp.close()
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        # The mapping is released when all the buffers returned
+        # by readraw() are gone.
+        self._mmap = None
         return
 
+    def ismapped(self):
+        return (self._mmap is not None)
+
     def eof(self):
         return (self._nframesleft == 0)
     
     def tell(self):
-        return self._fp.tell()
+        return self._pos
 
     def seek(self, i):
-        self._fp.setpos(i)
+        if self._fp is not None:
+            self._fp.setpos(i)
+        elif i < 0 or self.nframes < i:
+            raise ValueError('position not in range')
+        self._pos = i
         self._nframesleft = self.nframes-i
         return
 
     def readraw(self, nframes=0):
+        if self._mmap is None and self._fp is None:
+            raise ValueError('reader is closed')
         if nframes == 0 or self._nframesleft < nframes:
             nframes = self._nframesleft
         self._nframesleft -= nframes
-        return (nframes, self._fp.readframes(nframes))
+        if self._mmap is not None:
+            # Zero-copy view of the mapped file.
+            data = buffer(self._mmap, self._data+self._pos*self._framesize,
+                          nframes*self._framesize)
+        else:
+            data = self._fp.readframes(nframes)
+        self._pos += nframes
+        return (nframes, data)
     
-    def read(self, nframes=0):
-        assert self.nchannels == 1
+    # reads16: returns 16-bit mono samples of a channel
+    # (or the mixdown of all the channels if channel < 0).
+    # 16-bit mono PCM is returned as is.
+    def reads16(self, nframes=0, channel=-1):
+        (nframes,data) = self.readraw(nframes)
+        if (self.nchannels == 1 and self.sampwidth == 2 and
+            self.format == FORMAT_PCM):
+            return (nframes, data)
+        if wavcorr is not None:
+            data = wavcorr.pcmtos16(data, self.sampwidth, self.nchannels,
+                                    channel, self.format)
+        else:
+            block = pcm2block(data, self.sampwidth, self.format)
+            block = selectchannel(block, self.nchannels, channel)
+            if numpy is not None:
+                a = numpy.clip(numpy.floor(block*32768.0), -32768, 32767)
+                data = a.astype('<i2').tostring()
+            else:
+                a = [ int(max(-32768.0, min(32767.0, floor(x*32768.0)))) for x in block ]
+                data = array.array('h', a).tostring()
+        return (nframes, data)
+
+    def readblock(self, nframes=0):
         (_,data) = self.readraw(nframes)
-        a = array.array(self.arraytype)
-        a.fromstring(data)
-        return [ x*self.ratio for x in a ]
+        return pcm2block(data, self.sampwidth, self.format)
+    
+    def read(self, nframes=0, channel=-1):
+        block = self.readblock(nframes)
+        return selectchannel(block, self.nchannels, channel).tolist()
 
 
 ##  WaveWriter
@@ -63,19 +267,14 @@ class WaveWriter(object):
 
     def __init__(self, fp, 
                  nchannels=1, sampwidth=2,
-                 framerate=44100, nframes=None):
+                 framerate=44100, nframes=None, format=FORMAT_PCM):
         self.fp = fp
         self.nchannels = nchannels
         self.sampwidth = sampwidth
         self.framerate = framerate
         self.nframes = nframes
+        self.format = format
         self._nframeswritten = 0
-        if self.sampwidth == 1:
-            self.ratio = 255.0
-            self.arraytype = 'b'
-        else:
-            self.ratio = 32767.0
-            self.arraytype = 'h'
         if nframes is None:
             self._write_header(0, 0, 0, 0)
         else:
@@ -90,7 +289,7 @@ class WaveWriter(object):
         self.fp.write('RIFF')
         self.fp.write(struct.pack('<l4s4slhhllhh4sl',
                                   36+datalen, 'WAVE', 'fmt ', 16,
-                                  0x0001, nchannels, framerate,
+                                  self.format, nchannels, framerate,
                                   nchannels*sampwidth*framerate,
                                   nchannels*sampwidth,
                                   sampwidth*8, 'data', datalen))
@@ -115,11 +314,13 @@ class WaveWriter(object):
         self._nframeswritten += nframes
         return
     
+    def writeblock(self, block):
+        self.writeraw(block2pcm(block, self.sampwidth, self.format))
+        return
+    
     def write(self, frames):
         assert self.nchannels == 1
-        a = [ int(x*self.ratio) for x in frames ]
-        a = array.array(self.arraytype, a)
-        self.writeraw(a.tostring())
+        self.writeblock(frames)
         return
 
 
@@ -130,19 +331,22 @@ class CommandWavePlayer(object):
     PLAYER = ('aplay','-t','raw')
 
     def __init__(self, nchannels=1, sampwidth=2, framerate=44100,
-                 player=PLAYER):
-        if sampwidth == 1:
+                 player=PLAYER, format=FORMAT_PCM):
+        if format == FORMAT_FLOAT:
+            fmt = 'FLOAT_LE'
+        elif sampwidth == 1:
             fmt = 'U8'
-            self.ratio = 255.0
-            self.arraytype = 'b'
+        elif sampwidth == 3:
+            fmt = 'S24_3LE'
+        elif sampwidth == 4:
+            fmt = 'S32_LE'
         else:
             fmt = 'S16_LE'
-            self.ratio = 32767.0
-            self.arraytype = 'h'
         cmdline = player+('-c',str(nchannels),'-r',str(framerate),'-f',fmt)
         self.nchannels = nchannels
         self.sampwidth = sampwidth
         self.framerate = framerate
+        self.format = format
         self._process = subprocess.Popen(
             cmdline, stdin=subprocess.PIPE,
             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -167,10 +371,12 @@ class CommandWavePlayer(object):
     def tell(self):
         return self._nframeswritten
 
+    def writeblock(self, block):
+        self.writeraw(block2pcm(block, self.sampwidth, self.format))
+        return
+
     def write(self, frames):
-        data = [ int(x*self.ratio) for x in frames ]
-        data = array.array(self.arraytype, data)
-        self.writeraw(data.tostring())
+        self.writeblock(frames)
         return
 
     def writeraw(self, bytes):
@@ -191,12 +397,12 @@ class CommandWavePlayer(object):
 class PygameWavePlayer(WaveWriter):
 
     def __init__(self, nchannels=1, sampwidth=2,
-                 framerate=44100, nframes=None):
+                 framerate=44100, nframes=None, format=FORMAT_PCM):
         import pygame
         from cStringIO import StringIO
         fp = StringIO()
         pygame.mixer.init()
-        WaveWriter.__init__(self, fp, nchannels, sampwidth, framerate, nframes)
+        WaveWriter.__init__(self, fp, nchannels, sampwidth, framerate, nframes, format)
         self._channel = None
         return
 
@@ -214,3 +420,10 @@ class PygameWavePlayer(WaveWriter):
         sound = pygame.mixer.Sound(fp)
         self._channel = sound.play()
         return
+
+    # wait: waits until the sound played by flush() ends.
+    def wait(self):
+        import pygame
+        while self._channel is not None and self._channel.get_busy():
+            pygame.time.wait(100)
+        return